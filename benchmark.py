@@ -0,0 +1,145 @@
+import argparse
+from json import dumps as jDumps
+from os import cpu_count
+from pathlib import Path
+from platform import machine, node, system
+from tempfile import TemporaryDirectory
+
+from modules.bench import autoSplits, audioCodecs, runBench, runSplits, videoPresets
+from modules.cli import checkSplit
+from modules.helpers import now
+from modules.os import checkPaths
+from modules.sched import coreCount
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(
+        description="Benchmark encoder throughput on this host with generated clips."
+    )
+    parser.add_argument(
+        "-c",
+        "--codecs",
+        nargs="+",
+        default=[*videoPresets, *audioCodecs],
+        choices=[*videoPresets, *audioCodecs],
+        help="Codecs to benchmark. (default: all)",
+    )
+    parser.add_argument(
+        "-rs",
+        "--sizes",
+        nargs="+",
+        default=[480, 720, 1080],
+        type=int,
+        help="Heights of the generated 16:9 test clips. (default: 480 720 1080)",
+    )
+    parser.add_argument(
+        "-fr",
+        "--fps",
+        default=30,
+        type=int,
+        help="Frame rate of the generated test clips. (default: 30)",
+    )
+    parser.add_argument(
+        "-d",
+        "--duration",
+        default=10,
+        type=int,
+        help="Length of the generated test clips in seconds. (default: 10)",
+    )
+    parser.add_argument(
+        "-lr",
+        "--limitRes",
+        default=720,
+        type=int,
+        help="Resolution limit passed to optsVideo like optimizeAV -rs. (default: 720)",
+    )
+    parser.add_argument(
+        "-lf",
+        "--limitFps",
+        default=30,
+        type=int,
+        help="Frame rate limit passed to optsVideo like optimizeAV -fr. (default: 30)",
+    )
+    parser.add_argument(
+        "-sp",
+        "--splits",
+        nargs="*",
+        default=None,
+        type=checkSplit,
+        help="Also measure the aggregate speed of parallel video encodes split as "
+        "<jobs>x<threads>, e.g. 1x8 2x4 4x2, and report the best split for "
+        "optimizeAV -j/-th. (-sp without values: powers of two over all cores)",
+    )
+    parser.add_argument(
+        "-o",
+        "--out",
+        default=None,
+        type=Path,
+        help="Write the json report to this file as well as stdout.",
+    )
+    parser.add_argument(
+        "-k",
+        "--keep",
+        default=None,
+        type=Path,
+        help="Directory to keep generated clips in between runs. (default: temp dir)",
+    )
+    return parser.parse_args()
+
+
+def main():
+
+    pargs = parseArgs()
+
+    (ffmpegPath,) = checkPaths({"ffmpeg": r"C:\ffmpeg\bin\ffmpeg.exe"})
+
+    with TemporaryDirectory() as td:
+        clipDir = pargs.keep or Path(td)
+        clipDir.mkdir(parents=True, exist_ok=True)
+        results = runBench(
+            ffmpegPath,
+            clipDir,
+            pargs.sizes,
+            pargs.fps,
+            pargs.duration,
+            pargs.limitRes,
+            pargs.limitFps,
+            pargs.codecs,
+        )
+
+        if pargs.splits is not None:
+            splitResults, bestSplits = runSplits(
+                ffmpegPath,
+                clipDir,
+                pargs.sizes,
+                pargs.fps,
+                pargs.duration,
+                pargs.limitRes,
+                pargs.limitFps,
+                pargs.codecs,
+                pargs.splits or autoSplits(coreCount()),
+            )
+
+    report = {
+        "host": node(),
+        "platform": f"{system()}_{machine()}".lower(),
+        "cpus": cpu_count(),
+        "date": now(),
+        "limitRes": pargs.limitRes,
+        "limitFps": pargs.limitFps,
+        "results": results,
+    }
+
+    if pargs.splits is not None:
+        report = {**report, "splits": splitResults, "bestSplits": bestSplits}
+
+    report = jDumps(report, indent=2)
+
+    print(report)
+
+    if pargs.out:
+        pargs.out.write_text(report)
+
+
+if __name__ == "__main__":
+    main()
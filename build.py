@@ -146,7 +146,7 @@ distRoot = Path.cwd()
 td = TemporaryDirectory(ignore_cleanup_errors=True)
 buildRoot = Path(td.name)
 appEntry = buildRoot / "optimizeAV.py"  # Entry point
-entryFunc = "optimizeAV:exe"  # mod:fn / pkg.mod:fn
+entryFunc = "optimizeAV:main"  # mod:fn / pkg.mod:fn
 buildPath = buildRoot / "build"
 tempPath = buildRoot / "tmp"
 distDir = (
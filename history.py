@@ -0,0 +1,103 @@
+import argparse
+from json import dumps as jDumps
+from pathlib import Path
+from sys import exit
+from time import time
+
+from modules.helpers import bytesToMB, secsToHMS
+from modules.perfDb import defaultDb, groupCols, openDb, periods, trends
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(
+        description="Report encoding throughput trends from optimizeAV's "
+        "performance history database."
+    )
+    parser.add_argument(
+        "-db",
+        "--historyDb",
+        default=None,
+        type=Path,
+        help="History database, like optimizeAV -hd. (default: ~/.optimizeAV/perf.db)",
+    )
+    parser.add_argument(
+        "-g",
+        "--groupBy",
+        nargs="+",
+        default=["codec", "preset", "height"],
+        choices=groupCols,
+        help="Columns to group jobs by. (default: codec preset height)",
+    )
+    parser.add_argument(
+        "-p",
+        "--period",
+        default="week",
+        choices=[*periods],
+        help="Trend period. (default: week)",
+    )
+    parser.add_argument(
+        "-d",
+        "--days",
+        default=90,
+        type=int,
+        help="Only jobs from the last n days, 0 for all. (default: 90)",
+    )
+    parser.add_argument(
+        "-H",
+        "--host",
+        default=None,
+        type=str,
+        help="Only jobs from this host. (default: all hosts)",
+    )
+    parser.add_argument(
+        "-j",
+        "--json",
+        action="store_true",
+        help="Print the report as json.",
+    )
+    return parser.parse_args()
+
+
+def main():
+
+    pargs = parseArgs()
+
+    dbPath = pargs.historyDb or defaultDb()
+
+    if not dbPath.exists():
+        exit(f"No history database at: {dbPath}")
+
+    conn = openDb(dbPath)
+    since = time() - pargs.days * 86400 if pargs.days else 0
+    rows = trends(conn, pargs.groupBy, pargs.period, since, pargs.host)
+    conn.close()
+
+    if pargs.json:
+        print(jDumps(rows, indent=2))
+    else:
+        group = None
+        for row in rows:
+            rowGroup = [row[col] for col in pargs.groupBy]
+            if rowGroup != group:
+                group = rowGroup
+                print(
+                    "\n"
+                    + ", ".join(
+                        f"{col}: {val}" for col, val in zip(pargs.groupBy, group)
+                    )
+                )
+            print(
+                f"  {row['period']}: {row['files']} file(s),"
+                f" {secsToHMS(row['media'])} in: {secsToHMS(row['wall'])}"
+                f" at speed: x{row['speed']},"
+                f" {bytesToMB(row['inBytes'])} MB to {bytesToMB(row['outBytes'])} MB"
+                + (
+                    f" ({round(row['reduction'] * 100, 2)}% size reduction)."
+                    if row["reduction"] is not None
+                    else "."
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+from concurrent.futures import ThreadPoolExecutor
+from os import name as osName
+from subprocess import DEVNULL, PIPE, Popen
+from time import time
+
+from .ffUtils.ffmpeg import getffmpegCmd, optsVideo, selectCodec
+
+getClipCmd = lambda ffmpegPath, clip, width, height, fps, duration: [
+    ffmpegPath,
+    "-f",
+    "lavfi",
+    "-i",
+    f"testsrc2=size={width}x{height}:rate={fps}:duration={duration}",
+    "-f",
+    "lavfi",
+    "-i",
+    f"sine=frequency=1000:sample_rate=48000:duration={duration}",
+    "-c:v",
+    "ffv1",
+    "-c:a",
+    "flac",
+    "-loglevel",
+    "warning",
+    "-y",
+    str(clip),
+]  # lossless so decoding cost stays the same across hosts
+
+videoPresets = {
+    "avc": ["veryfast", "medium", "slow"],
+    "hevc": ["fast", "medium"],
+    "av1": ["10", "8"],
+}
+
+audioCodecs = ["aac", "he", "opus"]
+
+
+def runTimed(cmd):
+    """
+    Run cmd and return (wall seconds, peak rss in bytes or None, stderr, exit code).
+    Peak rss comes from wait4 and is only available on unix.
+    """
+    strtTime = time()
+    with Popen(cmd, stdout=DEVNULL, stderr=PIPE, text=True) as proc:
+        stderr = proc.stderr.read()
+        if osName == "posix":
+            from os import wait4, waitstatus_to_exitcode
+
+            _, status, usage = wait4(proc.pid, 0)
+            proc.returncode = waitstatus_to_exitcode(status)
+            rss = usage.ru_maxrss * 1024  # kB on linux
+        else:
+            proc.wait()
+            rss = None
+    return time() - strtTime, rss, stderr, proc.returncode
+
+
+def makeClips(ffmpegPath, clipDir, sizes, fps, duration):
+    clips = []
+    for height in sizes:
+        width = height * 16 // 9 // 2 * 2
+        clip = clipDir.joinpath(f"src-{height}p{fps}-{duration}s.mkv")
+        if not clip.exists():
+            _, _, stderr, code = runTimed(
+                getClipCmd(ffmpegPath, clip, width, height, fps, duration)
+            )
+            if code:
+                raise RuntimeError(f"Generating test clip failed: {stderr}")
+        clips.append((clip, height))
+    return clips
+
+
+def benchCmd(cmd, outFile, duration):
+    wall, rss, stderr, code = runTimed(cmd)
+    outSize = outFile.stat().st_size if outFile.exists() and not code else 0
+    if outFile.exists():
+        outFile.unlink()
+    return {
+        "wall": round(wall, 3),
+        "speed": round(duration / wall, 3) if wall else None,
+        "kbps": round(outSize * 8 / duration / 1000, 2),
+        "peakRss": rss,
+        "error": stderr.strip() if code else None,
+    }
+
+
+def runBench(ffmpegPath, clipDir, sizes, fps, duration, limitRes, limitFps, codecs):
+    """
+    Encode generated clips with every selected codec/preset through the same
+    getffmpegCmd/optsVideo/selectCodec paths as optimizeAV, returns result dicts.
+    """
+    results = []
+    clips = makeClips(ffmpegPath, clipDir, sizes, fps, duration)
+    for clip, height in clips:
+        ov = optsVideo(height, str(fps), limitRes, limitFps)
+        for codec in codecs:
+            if codec in audioCodecs:
+                if height != clips[0][1]:
+                    continue  # audio cost doesn't depend on resolution
+                configs = [(None, ["-vn"], selectCodec(codec), [])]
+            else:
+                configs = [
+                    (preset, selectCodec(codec, None, preset), ["-an"], ov)
+                    for preset in videoPresets.get(codec, [None])
+                ]
+            for preset, cv, ca, opts in configs:
+                outFile = clipDir.joinpath(f"out-{codec}.mkv")
+                cmd = getffmpegCmd(ffmpegPath, clip, outFile, ca, cv, opts)
+                results.append(
+                    {
+                        "codec": codec,
+                        "preset": preset,
+                        "height": height,
+                        "fps": fps,
+                        "duration": duration,
+                        "args": [*cv, *opts, *ca],
+                        **benchCmd([*cmd[:-1], "-y", cmd[-1]], outFile, duration),
+                    }
+                )
+    return results
+
+
+def autoSplits(cores):
+    # jobs x threads splits of all cores, jobs in powers of two
+    splits, jobs = [], 1
+    while jobs <= cores:
+        splits.append((jobs, cores // jobs))
+        jobs *= 2
+    return splits
+
+
+def benchSplit(ffmpegPath, clip, clipDir, duration, codec, preset, ov, jobs, threads):
+    # `jobs` concurrent encodes of clip with `threads` threads each
+    cmds = []
+    for n in range(jobs):
+        outFile = clipDir.joinpath(f"out-{codec}-{n}.mkv")
+        cv = selectCodec(codec, None, preset, threads)
+        cmd = getffmpegCmd(ffmpegPath, clip, outFile, ["-an"], cv, ov)
+        cmds.append(([*cmd[:-1], "-y", cmd[-1]], outFile, duration))
+    strtTime = time()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        runs = list(pool.map(lambda c: benchCmd(*c), cmds))
+    wall = time() - strtTime
+    errors = [r["error"] for r in runs if r["error"]]
+    rss = [r["peakRss"] for r in runs if r["peakRss"]]
+    return {
+        "wall": round(wall, 3),
+        "speed": round(jobs * duration / wall, 3) if wall else None,
+        "peakRss": sum(rss) if rss else None,
+        "error": errors[0] if errors else None,
+    }
+
+
+def runSplits(
+    ffmpegPath, clipDir, sizes, fps, duration, limitRes, limitFps, codecs, splits
+):
+    """
+    Aggregate throughput of every (jobs, threads) split for the selected video
+    codecs/presets, speed is media seconds encoded per second across all jobs.
+    Returns (results, best split per codec/preset/height).
+    """
+    results, best = [], {}
+    clips = makeClips(ffmpegPath, clipDir, sizes, fps, duration)
+    for clip, height in clips:
+        for codec in [c for c in codecs if c in videoPresets]:
+            for preset in videoPresets[codec]:
+                for jobs, threads in splits:
+                    ov = optsVideo(height, str(fps), limitRes, limitFps, threads)
+                    res = {
+                        "codec": codec,
+                        "preset": preset,
+                        "height": height,
+                        "jobs": jobs,
+                        "threads": threads,
+                        **benchSplit(
+                            ffmpegPath,
+                            clip,
+                            clipDir,
+                            duration,
+                            codec,
+                            preset,
+                            ov,
+                            jobs,
+                            threads,
+                        ),
+                    }
+                    results.append(res)
+                    key = (codec, preset, height)
+                    if not res["error"] and (
+                        key not in best or res["speed"] > best[key]["speed"]
+                    ):
+                        best[key] = res
+    return results, [
+        {k: r[k] for k in ["codec", "preset", "height", "jobs", "threads", "speed"]}
+        for r in best.values()
+    ]
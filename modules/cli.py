@@ -18,4 +18,32 @@ def checkValIn(valIn, typ, val):
         raise ArgumentTypeError("Invalid Value")
 
 
+def checkThreads(val):
+    # a positive count, "auto" or "off"
+    if val.lower() in ("auto", "off"):
+        return val.lower()
+    if val.isdigit() and int(val) > 0:
+        return int(val)
+    raise ArgumentTypeError("Invalid Value")
+
+
+def checkSplit(val):
+    # "<jobs>x<threads>", e.g. 2x4
+    jobs, _, threads = val.lower().partition("x")
+    if jobs.isdigit() and threads.isdigit() and int(jobs) and int(threads):
+        return int(jobs), int(threads)
+    raise ArgumentTypeError("Invalid Value")
+
+
+def checkProfile(types, val):
+    # "key=value,key=value" with a type/check function per key
+    opts = {}
+    for opt in val.split(","):
+        key, _, optVal = opt.partition("=")
+        if key not in types or not optVal:
+            raise ArgumentTypeError(f"Invalid profile option: {opt}")
+        opts[key] = types[key](optVal)
+    return opts
+
+
 # change excetion type?
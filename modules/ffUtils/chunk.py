@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+from shlex import join as shJoin
+from shutil import rmtree
+
+from ..io import printNLog
+from ..os import streamCmd
+from .ffmpeg import getffmpegCmd
+
+getSplitCmd = lambda ffmpegPath, file, chunkDir, chunkSize: [
+    ffmpegPath,
+    "-i",
+    str(file),
+    "-map",
+    "0:v:0",
+    "-c",
+    "copy",
+    "-f",
+    "segment",
+    "-segment_time",
+    str(chunkSize),
+    "-reset_timestamps",
+    "1",
+    "-loglevel",
+    "warning",
+    str(chunkDir.joinpath("src-%05d.mkv")),
+]  # segment muxer only cuts on keyframes when stream copying
+
+getConcatCmd = lambda ffmpegPath, listFile, audioFile, outFile: [
+    ffmpegPath,
+    "-f",
+    "concat",
+    "-safe",
+    "0",
+    "-i",
+    str(listFile),
+    *(["-i", str(audioFile)] if audioFile else []),
+    "-map",
+    "0:v",
+    *(["-map", "1:a"] if audioFile else []),
+    "-c",
+    "copy",
+    "-loglevel",
+    "warning",
+    str(outFile),
+]
+
+concatPath = lambda pth: "'{}'".format(pth.as_posix().replace("'", "'\\''"))
+
+
+def runCmds(cmds, jobs):
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        outs = list(pool.map(streamCmd, cmds))
+    errs = [o for o in outs if isinstance(o, Exception)]
+    return errs[0] if errs else "".join(outs)
+
+
+def encodeChunked(ffmpegPath, file, outFile, ca, cv, ov, chunkSize, jobs, audio=True):
+    """
+    Split the video stream at keyframes into ~chunkSize second chunks, encode the
+    chunks `jobs` at a time along with a single audio encode (audio=False for
+    inputs without an audio stream) and join them into outFile without
+    re-encoding. Returns output or an Exception like streamCmd.
+    """
+    chunkDir = outFile.parent.joinpath(f"{outFile.stem}-chunks")
+    chunkDir.mkdir(exist_ok=True)
+    try:
+        cmdOut = streamCmd(getSplitCmd(ffmpegPath, file, chunkDir, chunkSize))
+        if isinstance(cmdOut, Exception):
+            return cmdOut
+
+        chunks = sorted(chunkDir.glob("src-*.mkv"))
+        if not chunks:
+            return FileNotFoundError(f"No chunks were split from: {file}")
+        encChunks = [c.with_name(c.name.replace("src-", "enc-")) for c in chunks]
+        audioFile = chunkDir.joinpath("audio.mka") if audio else None
+
+        cmds = [
+            getffmpegCmd(ffmpegPath, src, enc, ["-an"], cv, ov)
+            for src, enc in zip(chunks, encChunks)
+        ]
+        if audioFile:
+            cmds.insert(0, getffmpegCmd(ffmpegPath, file, audioFile, ca, ["-vn"]))
+        printNLog("".join(f"\n{shJoin(cmd)}" for cmd in cmds[: 1 + bool(audioFile)]))
+        printNLog(f"\nEncoding: {len(chunks)} chunk(s) with {jobs} job(s).")
+
+        cmdOut = runCmds(cmds, jobs)
+        if isinstance(cmdOut, Exception):
+            return cmdOut
+
+        listFile = chunkDir.joinpath("chunks.txt")
+        listFile.write_text("".join(f"file {concatPath(c)}\n" for c in encChunks))
+
+        concatCmd = getConcatCmd(ffmpegPath, listFile, audioFile, outFile)
+        printNLog(f"\n{shJoin(concatCmd)}")
+        concatOut = streamCmd(concatCmd)
+        if isinstance(concatOut, Exception):
+            return concatOut
+        return f"{cmdOut}{concatOut}"
+    finally:
+        rmtree(chunkDir, ignore_errors=True)
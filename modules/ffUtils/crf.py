@@ -0,0 +1,129 @@
+from fractions import Fraction
+from math import log
+from statistics import fmean
+
+from ..io import printNLog
+from ..os import streamCmd
+from .ffmpeg import selectCodec, threadOpts
+from .metaCache import getTrial, putTrial
+
+crfRanges = {"avc": (17, 35), "hevc": (20, 40), "av1": (20, 63)}
+
+crfTrials = {"avc": (22, 30), "hevc": (26, 34), "av1": (40, 56)}
+
+getTrialCmd = lambda ffmpegPath, file, outFile, start, length, cv, ov: [
+    ffmpegPath,
+    "-ss",
+    str(start),
+    "-t",
+    str(length),
+    "-i",
+    str(file),
+    *cv,
+    *ov,
+    "-an",
+    "-loglevel",
+    "warning",
+    "-y",
+    str(outFile),
+]
+
+
+def samplePoints(duration, n=3, length=10):
+    # n evenly spaced (start, length) samples, whole file if it is too short
+    if duration < length * (n + 1):
+        return [(0, round(duration, 3))]
+    return [
+        (round(duration * (i + 1) / (n + 1) - length / 2, 3), length) for i in range(n)
+    ]
+
+
+def getBitrate(ca):
+    # audio bitrate in bits/s from selectCodec args, None for copy
+    try:
+        return int(ca[ca.index("-b:a") + 1].rstrip("k")) * 1000
+    except (ValueError, IndexError):
+        return None
+
+
+def targetRate(duration, targetSize=None, targetBpp=None, audioRate=0, dims=None):
+    # video bitrate in bits/s for a whole file size in MB or bits per pixel per frame
+    if targetSize:
+        return targetSize * 8 * (1 << 20) / duration - audioRate
+    width, height, fps = dims
+    return targetBpp * width * height * fps
+
+
+def outDims(width, height, fps, limitRes, limitFps):
+    fps = min(float(Fraction(fps)), limitFps)
+    if int(height) > limitRes:
+        return int(width) * limitRes / int(height), limitRes, fps
+    return int(width), int(height), fps
+
+
+def trialRate(ffmpegPath, file, tmpFile, cv, ov, samples, cache=None, threadArgs=[]):
+    # threadArgs don't change the output, so they're left out of the cache key
+    args = {"cv": cv, "ov": ov, "samples": samples}
+    rate = getTrial(cache, file, args) if cache else None
+    if rate is not None:
+        return rate
+    bits = 0
+    for start, length in samples:
+        cmdOut = streamCmd(
+            getTrialCmd(
+                ffmpegPath, file, tmpFile, start, length, cv, [*ov, *threadArgs]
+            )
+        )
+        if isinstance(cmdOut, Exception):
+            return cmdOut
+        bits += tmpFile.stat().st_size * 8
+        tmpFile.unlink()
+    rate = bits / sum(length for _, length in samples)
+    if cache:
+        putTrial(cache, file, args, rate)
+    return rate
+
+
+def fitCrf(points, rate, crfRange):
+    # least squares fit of log(bitrate) against crf, bitrate falls exponentially
+    xs = [crf for crf, _ in points]
+    ys = [log(r) for _, r in points]
+    mx, my = fmean(xs), fmean(ys)
+    var = sum((x - mx) ** 2 for x in xs)
+    if not var:
+        return None
+    k = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var
+    if k >= 0:
+        return None
+    crf = mx + (log(rate) - my) / k
+    return round(min(max(crf, crfRange[0]), crfRange[1]))
+
+
+def searchCrf(
+    ffmpegPath, file, tmpFile, codec, speed, ov, duration, rate, cache, threads=None
+):
+    """
+    Encode a few short samples at the trial crfs for codec and fit the crf that
+    should hit rate (video bits/s). Returns crf, None if no fit or an Exception.
+    threads limits the trial encodes like the job's own encode.
+    """
+    if rate <= 0:
+        return None
+    samples = samplePoints(duration)
+    threadArgs = (
+        [*threadOpts(codec, threads), "-filter_threads", str(threads)]
+        if threads
+        else []
+    )
+    points = []
+    for crf in crfTrials[codec]:
+        cv = selectCodec(codec, crf, speed)
+        trial = trialRate(ffmpegPath, file, tmpFile, cv, ov, samples, cache, threadArgs)
+        if isinstance(trial, Exception):
+            return trial
+        if trial > 0:
+            points.append((crf, trial))
+        printNLog(f"\nTrial crf: {crf} at: {round(trial / 1000, 2)} kbps")
+    crf = fitCrf(points, rate, crfRanges[codec])
+    printNLog(f"\nTarget: {round(rate / 1000, 2)} kbps, selected crf: {crf}")
+    return crf
@@ -0,0 +1,55 @@
+from fractions import Fraction
+
+from .ffmpeg import toFloat
+
+# source codecs that are at least as efficient as the selected output codec
+copyable = {
+    "avc": ["h264", "hevc", "av1"],
+    "hevc": ["hevc", "av1"],
+    "av1": ["av1"],
+    "aac": ["aac", "opus"],
+    "he": ["aac", "opus"],
+    "opus": ["opus"],
+}
+
+
+def toFps(rate):
+    try:
+        return float(Fraction(rate))
+    except (TypeError, ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def decideVideo(params, codec, limitRes, limitFps, maxBpp, fallbackKbps=0):
+    """
+    Returns ("copy" or "encode", reason) for the video stream, bit_rate in params
+    is in kbps as returned by getMeta, fallbackKbps is used when it's missing.
+    """
+    name = params.get("codec_name")
+    if name not in copyable.get(codec, []):
+        return "encode", f"codec: {name}"
+    height, fps = toFloat(params.get("height")), toFps(params.get("r_frame_rate"))
+    if height > limitRes:
+        return "encode", f"height: {int(height)} > {limitRes}"
+    if fps > limitFps:
+        return "encode", f"fps: {round(fps, 2)} > {limitFps}"
+    kbps = toFloat(params.get("bit_rate")) or fallbackKbps
+    pixels = toFloat(params.get("width")) * height * fps
+    if not (kbps and pixels):
+        return "encode", "unknown bitrate"
+    bpp = kbps * 1000 / pixels
+    if bpp > maxBpp:
+        return "encode", f"bpp: {round(bpp, 3)} > {maxBpp}"
+    return "copy", f"{name} at bpp: {round(bpp, 3)} <= {maxBpp}"
+
+
+def decideAudio(params, codec, maxKbps):
+    name = params.get("codec_name")
+    if name not in copyable.get(codec, []):
+        return "encode", f"codec: {name}"
+    kbps = toFloat(params.get("bit_rate"))
+    if not kbps:
+        return "encode", "unknown bitrate"
+    if kbps > maxKbps:
+        return "encode", f"bitrate: {kbps} > {maxKbps} kbps"
+    return "copy", f"{name} at: {kbps} <= {maxKbps} kbps"
@@ -1,6 +1,8 @@
 from fractions import Fraction
+from time import time
 
-from ..helpers import noNoneCast, defVal
+from ..helpers import flatten, noNoneCast, defVal
+from ..os import streamCmd
 
 getffmpegCmd = lambda ffmpegPath, file, outFile, ca, cv, ov=[]: [
     ffmpegPath,
@@ -14,8 +16,77 @@ getffmpegCmd = lambda ffmpegPath, file, outFile, ca, cv, ov=[]: [
     str(outFile),
 ]
 
-
-def selectCodec(codec, quality=None, speed=None):
+getffmpegMultiCmd = lambda ffmpegPath, file, outputs: [
+    ffmpegPath,
+    "-loglevel",
+    "warning",
+    "-i",
+    str(file),
+    *flatten([*cv, *ov, *ca, str(outFile)] for outFile, ca, cv, ov in outputs),
+]  # every output maps the same decoded streams, the input is decoded once
+
+progressOpts = ["-progress", "pipe:1", "-nostats"]
+
+
+def toFloat(val, default=0.0):
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return default
+
+
+def progressStats(state, duration, elapsed):
+    outTime = max(0.0, toFloat(state.get("out_time_us")) / 1e6)
+    speed = outTime / elapsed if elapsed else 0.0
+    # ETA from what's left of the probed duration at the speed so far
+    eta = (duration - outTime) / speed if duration and speed else None
+    return {
+        "outTime": outTime,
+        "duration": duration,
+        "fps": toFloat(state.get("fps")),
+        "speed": speed,
+        "size": int(toFloat(state.get("total_size"))),
+        "elapsed": elapsed,
+        "eta": max(0.0, eta) if eta is not None else None,
+        "done": state.get("progress") == "end",
+    }
+
+
+def runffmpeg(cmd, duration=0, onProgress=None, interval=10):
+    # onProgress(stats) is called at most once every interval seconds and at the end
+    if onProgress is None:
+        return streamCmd(cmd)
+
+    cmd = [cmd[0], *progressOpts, *cmd[1:]]
+    state = {}
+    strtTime = time()
+    lastTime = [strtTime]
+
+    def onLine(line):
+        key, _, val = line.strip().partition("=")
+        state[key] = val
+        if key != "progress":
+            return
+        now = time()
+        if val == "end" or now - lastTime[0] >= interval:
+            lastTime[0] = now
+            onProgress(progressStats(state, duration, now - strtTime))
+
+    return streamCmd(cmd, onLine)
+
+
+def threadOpts(codec, threads):
+    # explicit thread counts so parallel encoders don't each size to every core
+    if codec == "avc":
+        return ["-threads", str(threads)]
+    if codec == "hevc":
+        return ["-threads", str(threads), "-x265-params", f"pools={threads}"]
+    if codec == "av1":
+        return ["-threads", str(threads), "-svtav1-params", f"lp={threads}"]
+    return []
+
+
+def selectCodec(codec, quality=None, speed=None, threads=None):
 
     quality = noNoneCast(str, quality)
 
@@ -106,10 +177,25 @@ def selectCodec(codec, quality=None, speed=None):
             "240",
         ]  # -g fps*10
 
+    if threads:
+        cdc = [*cdc, *threadOpts(codec, threads)]
+
     return cdc
 
 
-def optsVideo(srcRes, srcFps, limitRes, limitFps):
+# codec args that copy the stream, with none also counting -vn as a copy
+copied = lambda cdc, none=False: cdc[1:2] == ["copy"] or (none and cdc == ["-vn"])
+
+
+def presetOf(cv):
+    # the preset in selectCodec args, None for codecs/copies without one
+    try:
+        return cv[cv.index("-preset:v") + 1]
+    except (ValueError, IndexError):
+        return None
+
+
+def optsVideo(srcRes, srcFps, limitRes, limitFps, threads=None):
 
     opts = [
         "-pix_fmt",
@@ -124,6 +210,9 @@ def optsVideo(srcRes, srcFps, limitRes, limitFps):
     if int(srcRes) > limitRes:
         opts = [*opts, "-vf", f"scale=-2:{str(limitRes)}"]
 
+    if threads:
+        opts = [*opts, "-filter_threads", str(threads)]
+
     return opts
 
 
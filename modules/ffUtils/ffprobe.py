@@ -1,8 +1,10 @@
+from concurrent.futures import ThreadPoolExecutor
 from json import loads as jLoads
 
 from ..helpers import round2
 from ..os import runCmd
 from ..io import printNLog
+from .metaCache import getCached, putCached
 
 getffprobeCmd = lambda ffprobePath, file: [
     ffprobePath,
@@ -27,6 +29,24 @@ def getMetaData(ffprobePath, file):
     return metaData
 
 
+def getMetaDataCached(ffprobePath, cache, file):
+    if cache is None:
+        return getMetaData(ffprobePath, file)
+    metaData = getCached(cache, file)
+    if metaData is None:
+        metaData = getMetaData(ffprobePath, file)
+        if not isinstance(metaData, Exception):
+            putCached(cache, file, metaData)
+    return metaData
+
+
+def probeAll(ffprobePath, cache, files, threads=8):
+    # probe files concurrently, returns {file: metaData or Exception}
+    probe = lambda file: getMetaDataCached(ffprobePath, cache, file)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return dict(zip(files, pool.map(probe, files)))
+
+
 def getParams(metaData, strm, params):
     paramDict = {}
     for param in params:
@@ -79,6 +99,13 @@ def getFormatData(meta, key):
     return meta["format"][key]
 
 
+def getDuration(metaData):
+    try:
+        return float(metaData["format"]["duration"])
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+
+
 def getTags(metaData, tags):
     js = metaData["format"]["tags"]
     return [js.get(tag, "") for tag in tags]
@@ -0,0 +1,114 @@
+import sqlite3
+from json import dumps as jDumps
+from json import loads as jLoads
+from threading import Lock
+from time import time
+
+from ..fs import statKey
+
+cacheLock = Lock()
+
+cacheSchema = """
+CREATE TABLE IF NOT EXISTS meta (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    used REAL NOT NULL,
+    data TEXT NOT NULL
+)
+"""
+
+trialSchema = """
+CREATE TABLE IF NOT EXISTS trials (
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    args TEXT NOT NULL,
+    used REAL NOT NULL,
+    rate REAL NOT NULL,
+    PRIMARY KEY (path, size, mtime_ns, args)
+)
+"""
+
+
+# hits only rewrite "used" once it's this old, each write is a commit on the NAS
+touchAge = 86400
+
+
+def openCache(dbPath, rebuild=False, maxAge=90):
+    # entries not used in maxAge days are evicted on open
+    conn = sqlite3.connect(str(dbPath), check_same_thread=False)
+    with cacheLock, conn:
+        if rebuild:
+            conn.execute("DROP TABLE IF EXISTS meta")
+            conn.execute("DROP TABLE IF EXISTS trials")
+        conn.execute(cacheSchema)
+        conn.execute(trialSchema)
+        for table in ("meta", "trials"):
+            conn.execute(
+                f"DELETE FROM {table} WHERE used < ?", (time() - maxAge * 86400,)
+            )
+    return conn
+
+
+def closeCache(conn):
+    with cacheLock:
+        conn.close()
+
+
+fileKey = lambda file: (str(file.resolve()), *statKey(file.stat()))
+
+
+def getCached(conn, file):
+    path, size, mtime = fileKey(file)
+    with cacheLock, conn:
+        row = conn.execute(
+            "SELECT size, mtime_ns, used, data FROM meta WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None:
+            return None
+        if (row[0], row[1]) != (size, mtime):
+            # file changed since it was probed
+            conn.execute("DELETE FROM meta WHERE path = ?", (path,))
+            return None
+        if time() - row[2] > touchAge:
+            conn.execute("UPDATE meta SET used = ? WHERE path = ?", (time(), path))
+    return jLoads(row[3])
+
+
+def putCached(conn, file, metaData):
+    path, size, mtime = fileKey(file)
+    with cacheLock, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?, ?, ?, ?)",
+            (path, size, mtime, time(), jDumps(metaData)),
+        )
+
+
+def getTrial(conn, file, args):
+    # trial encodes are keyed by the source identity and the exact trial args
+    key = (*fileKey(file), jDumps(args))
+    with cacheLock, conn:
+        row = conn.execute(
+            "SELECT rate, used FROM trials WHERE path = ? AND size = ?"
+            " AND mtime_ns = ? AND args = ?",
+            key,
+        ).fetchone()
+        if row is None:
+            return None
+        if time() - row[1] > touchAge:
+            conn.execute(
+                "UPDATE trials SET used = ? WHERE path = ? AND size = ? AND mtime_ns = ?"
+                " AND args = ?",
+                (time(), *key),
+            )
+    return row[0]
+
+
+def putTrial(conn, file, args, rate):
+    path, size, mtime = fileKey(file)
+    with cacheLock, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?, ?)",
+            (path, size, mtime, jDumps(args), time(), rate),
+        )
@@ -1,5 +1,8 @@
+from errno import EXDEV
 from functools import partial
+from os import getpid, scandir
 from pathlib import Path
+from shutil import copyfile, rmtree
 from re import sub
 from unicodedata import normalize
 
@@ -18,6 +21,27 @@ getFileListRec = lambda dirPath, exts: [
 
 getFileListAllRec = lambda dirPath: dirPath.rglob("*")
 
+
+def walkFiles(dirPath, exts, skipDir=None):
+    # lazy depth first walk, skipDir(dirEntry) prunes that directory
+    dirs = [dirPath]
+    while dirs:
+        files, subDirs = [], []
+        try:
+            with scandir(dirs.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not (skipDir and skipDir(entry)):
+                            subDirs.append(Path(entry.path))
+                    elif Path(entry.name).suffix.lower() in exts:
+                        files.append(Path(entry.path))
+        except OSError:
+            # unreadable or gone, skipped like rglob does
+            continue
+        dirs.extend(reversed(subDirs))
+        yield from files
+
+
 getDirList = lambda dirPath: [x for x in dirPath.iterdir() if x.is_dir()]
 
 pathifyList = lambda paths: [Path(x) for x in paths]
@@ -25,9 +49,11 @@ pathifyList = lambda paths: [Path(x) for x in paths]
 stringifyPaths = lambda paths: [str(x) for x in paths]
 
 
-def cleanUp(emptyDirs, files):
-    rmEmptyDirs(emptyDirs)
+def cleanUp(emptyDirs, files, trees=[]):
     rmFiles(files)
+    for tree in trees:
+        rmtree(tree, ignore_errors=True)
+    rmEmptyDirs(emptyDirs)
 
 
 def appendFile(file, contents):
@@ -59,6 +85,30 @@ def rmFiles(paths):
             path.unlink()
 
 
+statKey = lambda st: (st.st_size, st.st_mtime_ns)
+
+
+def publishFile(tmpFile, outFile):
+    """
+    Move tmpFile to outFile, across filesystems it is copied next to outFile first
+    and renamed so outFile never shows up partially written.
+    """
+    try:
+        tmpFile.replace(outFile)
+        return
+    except OSError as moveErr:
+        if moveErr.errno != EXDEV:
+            raise
+    partFile = outFile.with_name(f".{outFile.name}.{getpid()}.part")
+    try:
+        copyfile(tmpFile, partFile)
+        partFile.replace(outFile)
+    finally:
+        if partFile.exists():
+            partFile.unlink()
+    tmpFile.unlink()
+
+
 getFileSizes = lambda fileList: sum([file.stat().st_size for file in fileList])
 
 nPathSort = partial(sorted, key=lambda k: nSort(str(k.stem)))
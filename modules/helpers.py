@@ -2,7 +2,6 @@ from datetime import datetime, timedelta
 from functools import partial
 from itertools import chain
 from re import compile
-from sys import exit
 
 flatten = chain.from_iterable
 
@@ -27,11 +26,6 @@ bytesToMB = lambda bytes: round2(bytes / float(1 << 20))
 fileDTime = lambda: datetime.now().strftime("%y%m%d-%H%M%S")
 
 
-def nothingExit():
-    print("Nothing to do.")
-    exit()
-
-
 def nSort(s, nsre=compile("([0-9]+)")):
     return [int(text) if text.isdigit() else text.lower() for text in nsre.split(s)]
 
@@ -1,25 +1,60 @@
 from sys import exit
+from threading import Lock, local
 from time import sleep
 from traceback import format_exc
 from pathlib import Path
 import __main__
 
-from .fs import appendFile
-from .helpers import now, timeNow
+from .helpers import bytesToMB, now, round2, secsToHMS, timeNow
+from .logSink import writeSink
 from .pkgState import getLogFile
 
+logLock = Lock()
+logSection = local()
 
-def printNLog(msg):
-    msg = str(msg)
+
+# a message already shown on the console, only written to the log
+logOnly = lambda msg: (str(msg),)
+
+
+def writeLog(*msgs):
     logFile = getLogFile()
-    print(msg)
-    if logFile:
-        appendFile(logFile, msg)
+    with logLock:
+        for msg in msgs:
+            if isinstance(msg, tuple):
+                msg = msg[0]
+            else:
+                msg = str(msg)
+                print(msg)
+            if logFile:
+                writeSink(msg)
+
+
+def printNLog(msg):
+    section = getattr(logSection, "msgs", None)
+    if section is not None:
+        section.append(str(msg))
+    else:
+        writeLog(msg)
+
+
+def startSection(msgs=None):
+    # messages from this thread are held back in msgs until endSection
+    logSection.msgs = [] if msgs is None else msgs
+    return logSection.msgs
+
+
+def endSection(flush=True):
+    # flush=False leaves the messages to be written later with writeLog
+    msgs = getattr(logSection, "msgs", None)
+    logSection.msgs = None
+    if msgs and flush:
+        writeLog(*msgs)
 
 
 def reportErr(exp=None):
     printNLog("\n------\nERROR: Something went wrong.")
-    if exp and exp.stderr:
+    if exp and getattr(exp, "stderr", None):
         printNLog(f"\nStdErr: {exp.stderr}\nReturn Code: {exp.returncode}")
     if exp:
         printNLog(
@@ -28,13 +63,31 @@ def reportErr(exp=None):
 
 
 def statusInfo(status, idx, file):
-    printNLog(
-        f"\n----------------\n{status} file {idx}:" f" {str(file.name)} at {timeNow()}",
+    msg = f"\n----------------\n{status} file {idx}: {str(file.name)} at {timeNow()}"
+    section = getattr(logSection, "msgs", None)
+    if section is None:
+        writeLog(msg)
+    else:
+        # live on the console, in the log with the rest of the file's section
+        print(msg)
+        section.append(logOnly(msg))
+
+
+def progressInfo(idx, file, prog):
+    eta = "N/A" if prog["eta"] is None else secsToHMS(prog["eta"])
+    print(
+        f"Progress file {idx}: {str(file.name)}"
+        f" {secsToHMS(prog['outTime'])}/{secsToHMS(prog['duration'])}"
+        f" at fps: {round2(prog['fps'])} speed: x{round2(prog['speed'])}"
+        f" size: {bytesToMB(prog['size'])} MB ETA: {eta}",
+        flush=True,
     )
 
 
 def startMsg():
-    printNLog(f"\n\n====== {Path(__main__.__file__).stem} Started at {now()} ======\n")
+    # no __file__ when main() is called from an interactive session or -c
+    name = Path(getattr(__main__, "__file__", "python")).stem
+    printNLog(f"\n\n====== {name} Started at {now()} ======\n")
 
 
 def waitN(n):
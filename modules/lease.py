@@ -0,0 +1,99 @@
+from hashlib import sha1
+from json import dumps as jDumps
+from os import O_CREAT, O_EXCL, O_WRONLY, close, link, utime, write
+from os import open as osOpen
+from threading import Event, Lock, Thread
+from time import time
+
+# leases held by this process, key -> lease file
+leases = {}
+leaseLock = Lock()
+heartbeat = {"thread": None, "stop": Event()}
+
+leasePath = lambda leaseDir, key: leaseDir.joinpath(
+    f"{sha1(key.encode()).hexdigest()}.lease"
+)
+
+
+def tryCreate(path, owner, key):
+    # O_EXCL create is atomic on local filesystems and NFSv3+
+    try:
+        fd = osOpen(path, O_CREAT | O_EXCL | O_WRONLY)
+    except FileExistsError:
+        return False
+    try:
+        write(fd, jDumps({"owner": owner, "file": key, "time": time()}).encode())
+    finally:
+        close(fd)
+    return True
+
+
+leaseAge = lambda path: time() - path.stat().st_mtime
+
+
+def breakStale(path, owner, ttl):
+    """
+    Move a lease not refreshed within ttl seconds out of the way, only one host
+    can win the rename. A lease that turns out to be fresh is put back.
+    """
+    stale = path.with_name(f"{path.name}.{sha1(owner.encode()).hexdigest()}.stale")
+    try:
+        if leaseAge(path) < ttl:
+            return False
+        path.rename(stale)
+    except FileNotFoundError:
+        return True  # released or broken by another host meanwhile
+    if leaseAge(stale) < ttl:
+        # another host renewed it between our stat and rename
+        try:
+            link(stale, path)
+        except FileExistsError:
+            pass
+        stale.unlink()
+        return False
+    stale.unlink()
+    return True
+
+
+def claimLease(leaseDir, key, owner, ttl):
+    path = leasePath(leaseDir, key)
+    claimed = tryCreate(path, owner, key) or (
+        breakStale(path, owner, ttl) and tryCreate(path, owner, key)
+    )
+    if claimed:
+        with leaseLock:
+            leases[key] = path
+        startHeartbeat(ttl / 3)
+    return claimed
+
+
+def releaseLease(key):
+    with leaseLock:
+        path = leases.pop(key, None)
+    if path and path.exists():
+        path.unlink()
+
+
+def releaseAll():
+    heartbeat["stop"].set()
+    for key in list(leases):
+        releaseLease(key)
+
+
+def renewLeases(interval):
+    while not heartbeat["stop"].wait(interval):
+        with leaseLock:
+            paths = list(leases.values())
+        for path in paths:
+            try:
+                utime(path)
+            except FileNotFoundError:
+                continue
+
+
+def startHeartbeat(interval):
+    if heartbeat["thread"] is None:
+        heartbeat["thread"] = Thread(
+            target=renewLeases, args=(interval,), name="leaseHeartbeat", daemon=True
+        )
+        heartbeat["thread"].start()
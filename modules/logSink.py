@@ -0,0 +1,61 @@
+from queue import Queue
+from threading import Thread
+
+logQueue = Queue()
+sink = {"thread": None, "file": None, "maxSize": None, "backups": 3}
+
+
+def rotateLog(file, backups):
+    # file.log -> file.1.log -> file.2.log ... oldest is dropped
+    oldest = file.with_suffix(f".{backups}{file.suffix}")
+    if oldest.exists():
+        oldest.unlink()
+    for n in reversed(range(1, backups)):
+        older = file.with_suffix(f".{n}{file.suffix}")
+        if older.exists():
+            older.replace(file.with_suffix(f".{n + 1}{file.suffix}"))
+    if file.exists():
+        file.replace(file.with_suffix(f".1{file.suffix}"))
+
+
+def drainQueue(first):
+    batch = [first]
+    while not logQueue.empty():
+        batch.append(logQueue.get())
+    return batch
+
+
+def logWriter():
+    stop = False
+    while not stop:
+        batch = drainQueue(logQueue.get())
+        msgs = [m for m in batch if m is not None]
+        stop = len(msgs) < len(batch)
+        file = sink["file"]
+        if msgs and file:
+            with open(file, "a") as f:
+                f.write("".join(msgs))
+                size = f.tell()
+            if sink["maxSize"] and size >= sink["maxSize"]:
+                rotateLog(file, sink["backups"])
+        for _ in batch:
+            logQueue.task_done()
+
+
+def startSink(file, maxSize=None, backups=3):
+    sink.update(file=file, maxSize=maxSize, backups=max(1, backups))
+    if sink["thread"] is None:
+        sink["thread"] = Thread(target=logWriter, name="logWriter", daemon=True)
+        sink["thread"].start()
+
+
+def writeSink(msg):
+    logQueue.put(str(msg))
+
+
+def stopSink():
+    thread = sink["thread"]
+    if thread is not None:
+        logQueue.put(None)
+        thread.join()
+        sink["thread"] = None
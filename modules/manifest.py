@@ -0,0 +1,53 @@
+from json import dumps as jDumps
+from json import loads as jLoads
+from threading import Lock
+
+from .fs import appendFile, statKey
+
+manifestLock = Lock()
+
+
+def loadManifest(file):
+    # one json entry per line, later entries for the same input win
+    entries = {}
+    if not file.exists():
+        return entries
+    with open(file, "r") as f:
+        text = f.read()
+    for line in text.splitlines():
+        try:
+            entry = jLoads(line)
+        except ValueError:
+            continue  # partial line left by an interrupted run
+        entries[entry["file"]] = entry
+    if text and not text.endswith("\n"):
+        appendFile(file, "\n")
+    return entries
+
+
+def addEntry(file, entries, entry):
+    with manifestLock:
+        entries[entry["file"]] = entry
+        appendFile(file, f"{jDumps(entry)}\n")
+
+
+def isDone(entries, key, file, settings):
+    entry = entries.get(key)
+    if entry is None:
+        return None
+    return (
+        entry.get("result") in ("done", "skipped")
+        and (entry["size"], entry["mtime_ns"]) == statKey(file.stat())
+        and entry["settings"] == settings
+    )
+
+
+def makeEntry(key, file, settings, **kwargs):
+    size, mtime = statKey(file.stat())
+    return {
+        "file": key,
+        "size": size,
+        "mtime_ns": mtime,
+        "settings": settings,
+        **kwargs,
+    }
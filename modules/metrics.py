@@ -0,0 +1,51 @@
+from json import dumps as jDumps
+from threading import Lock
+
+from .fs import appendFile
+
+metricsLock = Lock()
+
+promMetrics = [
+    ("files", "Files handled in this batch by status."),
+    ("input_bytes", "Input bytes of the files encoded in this batch."),
+    ("output_bytes", "Output bytes of the files encoded in this batch."),
+    ("media_seconds", "Media duration of the files encoded in this batch."),
+    ("encode_seconds", "Wall time spent encoding in this batch."),
+    ("batch_start_timestamp_seconds", "Unix time the batch started."),
+    ("last_update_timestamp_seconds", "Unix time these metrics were written."),
+]
+
+
+def writeRecord(file, record):
+    # one json object per line
+    with metricsLock:
+        appendFile(file, f"{jDumps(record)}\n")
+
+
+escLabel = lambda val: (
+    str(val).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+)
+
+fmtLabels = lambda labels: ",".join(f'{k}="{escLabel(v)}"' for k, v in labels.items())
+
+
+def writeProm(file, totals, labels, prefix="optimizeav"):
+    """
+    Write totals in the prometheus text format for node_exporter's textfile
+    collector, totals["files"] is a {status: count} dict. Replaced atomically.
+    """
+    lines = []
+    for name, desc in promMetrics:
+        metric = f"{prefix}_{name}"
+        lines += [f"# HELP {metric} {desc}", f"# TYPE {metric} gauge"]
+        val = totals.get(name, 0)
+        if isinstance(val, dict):
+            for status, count in sorted(val.items()):
+                lbls = fmtLabels({**labels, "status": status})
+                lines.append(f"{metric}{{{lbls}}} {count}")
+        else:
+            lines.append(f"{metric}{{{fmtLabels(labels)}}} {val}")
+    tmp = file.with_name(f".{file.name}.tmp")
+    with metricsLock:
+        tmp.write_text("\n".join(lines) + "\n")
+        tmp.replace(file)
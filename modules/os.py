@@ -1,5 +1,8 @@
+from collections import deque
+from re import compile
 from shutil import which as shWhich
-from subprocess import run
+from subprocess import PIPE, CalledProcessError, Popen, run
+from threading import Thread
 
 
 def runCmd(cmd):
@@ -11,6 +14,84 @@ def runCmd(cmd):
     return cmdOut
 
 
+# hex addresses and numbers, so per frame warnings count as one message
+maskNums = compile(r"0x[0-9a-fA-F]+|\d+")
+
+
+def newCapture(tail=50, repeats=5, maxLines=500, maxLen=1000):
+    # bounded output capture, the same size however much a process logs
+    return {
+        "lines": [],
+        "tail": deque(maxlen=tail),
+        "seen": {},
+        "dropped": 0,
+        "repeats": repeats,
+        "maxLines": maxLines,
+        "maxLen": maxLen,
+    }
+
+
+def captureLine(cap, line):
+    """
+    Keep line unless the same message was kept repeats times already or
+    maxLines are kept, the last tail lines are kept regardless for errors.
+    """
+    line = line[: cap["maxLen"]]
+    cap["tail"].append(line)
+    shape = maskNums.sub("#", line)
+    seen = cap["seen"].get(shape, 0)
+    if seen < cap["repeats"] and len(cap["lines"]) < cap["maxLines"]:
+        cap["seen"][shape] = seen + 1
+        cap["lines"].append(line)
+    else:
+        cap["dropped"] += 1
+
+
+def capturedText(cap):
+    text = "".join(cap["lines"])
+    if cap["dropped"]:
+        text = f"{text}... {cap['dropped']} repeated/excess line(s) not shown\n"
+    return text
+
+
+def drainLines(stream, cap):
+    for line in stream:
+        captureLine(cap, line)
+
+
+def streamCmd(cmd, onLine=None):
+    """
+    Run cmd reading its output line by line, stdout lines go to onLine or are
+    captured like stderr. Returns the captured text or a CalledProcessError with
+    the last lines of stderr, memory stays bounded however long cmd runs.
+    """
+    outCap, errCap = newCapture(), newCapture()
+    try:
+        with Popen(cmd, stdout=PIPE, stderr=PIPE, text=True, bufsize=1) as proc:
+            errThread = Thread(
+                target=drainLines, args=(proc.stderr, errCap), daemon=True
+            )
+            errThread.start()
+            try:
+                for line in proc.stdout:
+                    if onLine is None:
+                        captureLine(outCap, line)
+                    else:
+                        onLine(line)
+            except BaseException:
+                proc.kill()
+                raise
+            proc.wait()
+            errThread.join()
+        if proc.returncode:
+            raise CalledProcessError(
+                proc.returncode, cmd, stderr="".join(errCap["tail"])
+            )
+    except Exception as callErr:
+        return callErr
+    return f"{capturedText(outCap)}{capturedText(errCap)}"
+
+
 def checkPaths(paths):  # check abs paths too?
     retPaths = []
     for path, absPath in paths.items():
@@ -0,0 +1,130 @@
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from time import time
+
+dbLock = Lock()
+
+defaultDb = lambda: Path.home().joinpath(".optimizeAV", "perf.db")
+
+jobSchema = """
+CREATE TABLE IF NOT EXISTS jobs (
+    time REAL NOT NULL,
+    host TEXT NOT NULL,
+    key TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    preset TEXT,
+    audio TEXT NOT NULL,
+    args TEXT NOT NULL,
+    height INTEGER,
+    fps REAL,
+    renditions INTEGER NOT NULL,
+    jobs INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    wall REAL NOT NULL,
+    inBytes INTEGER NOT NULL,
+    outBytes INTEGER NOT NULL
+)
+"""
+
+jobIndex = "CREATE INDEX IF NOT EXISTS jobsKey ON jobs (host, key, time)"
+
+jobCols = [
+    "time",
+    "host",
+    "key",
+    "codec",
+    "preset",
+    "audio",
+    "args",
+    "height",
+    "fps",
+    "renditions",
+    "jobs",
+    "duration",
+    "wall",
+    "inBytes",
+    "outBytes",
+]
+
+# columns jobs can be grouped by in reports
+groupCols = ["host", "codec", "preset", "audio", "height", "renditions", "jobs"]
+
+periods = {"day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}
+
+
+def openDb(dbPath):
+    dbPath.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(dbPath), check_same_thread=False)
+    with dbLock, conn:
+        conn.execute(jobSchema)
+        conn.execute(jobIndex)
+    return conn
+
+
+def closeDb(conn):
+    with dbLock:
+        conn.close()
+
+
+def addJob(conn, job):
+    # job is a dict with jobCols keys, time defaults to now
+    row = {"time": time(), **job}
+    with dbLock, conn:
+        conn.execute(
+            f"INSERT INTO jobs ({', '.join(jobCols)})"
+            f" VALUES ({', '.join('?' for _ in jobCols)})",
+            [row[col] for col in jobCols],
+        )
+
+
+def learned(conn, host, key, limit=20):
+    """
+    Totals of the last limit jobs on host with the same output settings key:
+    {"files", "media", "wall", "inBytes", "outBytes"}, None if there are none.
+    """
+    with dbLock:
+        row = conn.execute(
+            "SELECT COUNT(*), SUM(duration), SUM(wall), SUM(inBytes), SUM(outBytes)"
+            " FROM (SELECT * FROM jobs WHERE host = ? AND key = ?"
+            " ORDER BY time DESC LIMIT ?)",
+            (host, key, limit),
+        ).fetchone()
+    if not (row[0] and row[1] and row[2]):
+        return None
+    return dict(zip(["files", "media", "wall", "inBytes", "outBytes"], row))
+
+
+def trends(conn, groupBy, period="week", since=0, host=None):
+    """
+    Throughput per period and groupBy columns (from groupCols) of the jobs
+    since a unix time, speed is media seconds encoded per wall second.
+    """
+    cols = [col for col in groupBy if col in groupCols]
+    query = (
+        f"SELECT strftime('{periods[period]}', time, 'unixepoch', 'localtime') AS p,"
+        f" {''.join(f'{col}, ' for col in cols)}"
+        "COUNT(*), SUM(duration), SUM(wall), SUM(inBytes), SUM(outBytes)"
+        " FROM jobs WHERE time >= ?"
+        + (" AND host = ?" if host else "")
+        + f" GROUP BY {', '.join([*cols, 'p'])} ORDER BY {', '.join([*cols, 'p'])}"
+    )
+    with dbLock:
+        rows = conn.execute(query, (since, host) if host else (since,)).fetchall()
+    results = []
+    for row in rows:
+        files, media, wall, inBytes, outBytes = row[-5:]
+        results.append(
+            {
+                "period": row[0],
+                **dict(zip(cols, row[1:-5])),
+                "files": files,
+                "media": round(media, 3),
+                "wall": round(wall, 3),
+                "speed": round(media / wall, 3) if wall else None,
+                "inBytes": inBytes,
+                "outBytes": outBytes,
+                "reduction": round(1 - outBytes / inBytes, 4) if inBytes else None,
+            }
+        )
+    return results
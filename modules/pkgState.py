@@ -1,11 +1,18 @@
+import atexit
 from pathlib import Path
 
+from .logSink import startSink, stopSink
+
 logFile = None
 
 
-def setLogFile(lf):
+def setLogFile(lf, maxSize=None, backups=3):
+    # log writes go through a background sink, flushed at exit
     global logFile
+    if logFile is None:
+        atexit.register(stopSink)
     logFile = Path(lf)
+    startSink(logFile, maxSize, backups)
     return logFile
 
 
@@ -0,0 +1,351 @@
+from json import dumps as jDumps, loads as jLoads
+from math import log
+from pathlib import Path
+from platform import node
+from shutil import disk_usage
+from time import time
+
+from .ffUtils.crf import crfTrials, getBitrate, outDims, samplePoints, targetRate
+from .ffUtils.decide import toFps
+from .ffUtils.ffmpeg import copied, presetOf, toFloat
+from .ffUtils.ffprobe import getDuration, getMeta
+from .helpers import bytesToMB, now, round2, secsToHMS
+from .io import printNLog
+
+
+def outPixRate(params, limitRes, limitFps):
+    # output pixels per second after optsVideo's scaling and frame rate limit
+    width, height = toFloat(params.get("width")), toFloat(params.get("height"))
+    fps = min(toFps(params.get("r_frame_rate")), limitFps)
+    if height > limitRes:
+        width, height = width * limitRes / height, limitRes
+    return width * height * fps
+
+
+def loadCalibration(file):
+    """
+    Speed model from a benchmark.py report (-o) made on the host that will
+    encode: (output pixels/s, pixels encoded per second, bits per pixel) per
+    video codec/preset and media seconds encoded per second per audio codec.
+    """
+    report = jLoads(file.read_text())
+    model = {"host": report.get("host"), "video": {}, "audio": {}}
+    for res in report["results"]:
+        if res["error"] or not res["speed"]:
+            continue
+        if res["preset"] is None:
+            model["audio"][res["codec"]] = res["speed"]
+            continue
+        height, fps = res["height"], res["fps"]
+        pixRate = outPixRate(
+            {"width": height * 16 // 9 // 2 * 2, "height": height, "r_frame_rate": fps},
+            report.get("limitRes") or height,
+            report.get("limitFps") or fps,
+        )
+        model["video"].setdefault((res["codec"], res["preset"]), []).append(
+            (pixRate, res["speed"] * pixRate, res["kbps"] * 1000 / pixRate)
+        )
+    return model
+
+
+# media seconds encoded per second and output bytes per media second from totals
+sumsModel = lambda files, media, wall, outBytes, source: {
+    "speed": media / wall,
+    "bytesPerSec": outBytes / media,
+    "files": files,
+    "source": source,
+}
+
+
+def loadHistory(manifest, settings):
+    """
+    Media seconds encoded per second and output bytes per media second of the
+    files a profile's manifest has done with the same settings, None if none.
+    """
+    done = [
+        e
+        for e in manifest.values()
+        if e.get("result") == "done" and e["settings"] == settings and e["timeTaken"]
+    ]
+    media = sum(e["length"] for e in done)
+    if not media:
+        return None
+    return sumsModel(
+        len(done),
+        media,
+        sum(e["timeTaken"] for e in done),
+        sum(e["outSize"] for e in done),
+        "manifest",
+    )
+
+
+def predictRend(calib, hist, duration, video, audio, videoKbps=None):
+    """
+    (encode seconds, output bytes, model) for one rendition of a file, seconds
+    and bytes are None where the models can't tell. video is None for audio
+    only or {"codec", "preset", "pixRate", "srcKbps"}, audio {"codec", "kbps",
+    "srcKbps"} with "vc"/"ac" codecs for copied streams. videoKbps is a known
+    video bitrate (-ts/-tb). History of the profile wins over calibration.
+    """
+    audioBits = audio["srcKbps" if audio["codec"] == "ac" else "kbps"] * 1000
+    if video is None:
+        videoBits = 0
+    elif videoKbps is not None:
+        videoBits = videoKbps * 1000
+    elif video["codec"] == "vc":
+        videoBits = video["srcKbps"] * 1000
+    else:
+        videoBits = None
+
+    if hist:
+        outBytes = hist["bytesPerSec"] * duration
+        if videoKbps is not None:
+            outBytes = (videoBits + audioBits) * duration / 8
+        return duration / hist["speed"], outBytes, "history"
+
+    if not calib:
+        if videoBits is None:
+            return None, None, None
+        return None, (videoBits + audioBits) * duration / 8, None
+
+    encodeTime = 0.0
+    if audio["codec"] != "ac":
+        speed = calib["audio"].get(audio["codec"])
+        encodeTime = duration / speed if speed else None
+
+    if video is not None and video["codec"] != "vc":
+        points = calib["video"].get((video["codec"], video["preset"]))
+        if not points or not video["pixRate"]:
+            return None, None, None
+        # the benchmarked size closest to this output, encoders don't scale linearly
+        pixRate, pixPerSec, bpp = min(
+            points, key=lambda p: abs(log(p[0] / video["pixRate"]))
+        )
+        if encodeTime is not None:
+            encodeTime += duration * video["pixRate"] / pixPerSec
+        if videoBits is None:
+            videoBits = bpp * video["pixRate"]
+
+    return encodeTime, (videoBits + audioBits) * duration / 8, "calibration"
+
+
+def diskNeeds(needs):
+    """
+    [{"paths", "need", "free"}] per filesystem from {directory: bytes needed},
+    directories on the same filesystem are added up.
+    """
+    byDev = {}
+    for path, need in needs.items():
+        entry = byDev.setdefault(
+            path.stat().st_dev,
+            {"paths": [], "need": 0, "free": disk_usage(path).free},
+        )
+        entry["paths"].append(str(path))
+        entry["need"] += need
+    return list(byDev.values())
+
+
+def planFile(pargs, meta, key, file, profs, metaData, calib, hists, decide=None):
+    """
+    Forecast for the renditions of one file, decided like encodeFile does.
+    decide(metaData, vdoParams, adoParams) gives the file's (cv, ca) for -dc,
+    None when all its streams would be copied and the file is skipped.
+    """
+    record = {"file": key, "inBytes": file.stat().st_size}
+    if isinstance(metaData, Exception):
+        return {**record, "status": "error", "error": str(metaData)}
+
+    duration = getDuration(metaData)
+    adoParams = getMeta(metaData, meta, "audio")
+    vdoParams = None if pargs.cVideo == "vn" else getMeta(metaData, meta, "video")
+    record["duration"] = duration
+
+    if decide:
+        decided = decide(metaData, vdoParams, adoParams)
+        if decided is None:
+            return {**record, "status": "skip"}
+
+    rends = []
+    for prof in profs:
+        rendCv, rendCa = decided if decide else (prof["cv"], prof["ca"])
+        # no audio in the output when the input has none
+        audioRate = (getBitrate(rendCa) or 0) if adoParams else 0
+        audio = {
+            "codec": "ac" if copied(rendCa) or not adoParams else prof["cAudio"],
+            "kbps": audioRate / 1000,
+            "srcKbps": toFloat(adoParams.get("bit_rate")),
+        }
+        video, videoKbps, trialMedia = None, None, 0
+        if vdoParams and rendCv != ["-vn"]:
+            video = {
+                "codec": "vc" if copied(rendCv) else prof["cVideo"],
+                "preset": presetOf(rendCv),
+                "pixRate": outPixRate(vdoParams, prof["res"], prof["fps"]),
+                "srcKbps": toFloat(vdoParams.get("bit_rate")),
+            }
+            targetMode = pargs.targetSize or pargs.targetBpp
+            if targetMode and duration and not copied(rendCv):
+                videoKbps = (
+                    targetRate(
+                        duration,
+                        pargs.targetSize,
+                        pargs.targetBpp,
+                        audioRate,
+                        outDims(
+                            vdoParams["width"],
+                            vdoParams["height"],
+                            vdoParams["r_frame_rate"],
+                            prof["res"],
+                            prof["fps"],
+                        ),
+                    )
+                    / 1000
+                )
+                samples = samplePoints(duration)
+                trialMedia = sum(l for _, l in samples) * len(crfTrials[prof["cVideo"]])
+
+        encodeTime, outBytes, model = predictRend(
+            calib, hists[prof["outDir"]], duration, video, audio, videoKbps
+        )
+        if encodeTime is not None and duration:
+            encodeTime *= 1 + trialMedia / duration  # crf trial encodes
+        rends.append(
+            {
+                "outDir": prof["outDir"].name,
+                "encodeTime": encodeTime,
+                "outBytes": outBytes,
+                "model": model,
+            }
+        )
+
+    # history times are whole jobs (one decode for every rendition),
+    # calibrated ones are per encoder and add up
+    times = {
+        m: [r["encodeTime"] for r in rends if r["model"] == m]
+        for m in ["history", "calibration"]
+    }
+    known = lambda key: all(r[key] is not None for r in rends)
+    return {
+        **record,
+        "status": "encode",
+        "encodeTime": (
+            max(times["history"], default=0) + sum(times["calibration"])
+            if known("encodeTime")
+            else None
+        ),
+        "outBytes": (sum(r["outBytes"] for r in rends) if known("outBytes") else None),
+        "renditions": rends,
+    }
+
+
+def planFiles(pargs, meta, profiles, files, todo, probe, getKey, learnedFor, decide):
+    """
+    Probe the files that aren't done yet and write a forecast of their
+    encode time, output size and the disk space needed, nothing is encoded.
+    todo is [(file, profiles it isn't done for)] of files, probe(files) gives
+    {file: metaData} and learnedFor(prof) the history database sums, if any.
+    """
+    calib = loadCalibration(pargs.calibration) if pargs.calibration else None
+    if calib and calib["host"] != node():
+        printNLog(f"\nWARNING: calibration is from host: {calib['host']}")
+    hists = {}
+    for prof in profiles:
+        known = learnedFor(prof)
+        if known:
+            hist = sumsModel(
+                known["files"],
+                known["media"],
+                known["wall"],
+                known["outBytes"],
+                "database",
+            )
+        else:
+            hist = loadHistory(prof["manifest"], prof["settings"])
+        hists[prof["outDir"]] = hist
+        if hist:
+            model = (
+                f"history of {hist['files']} file(s) from the {hist['source']}"
+                f" at x{round2(hist['speed'])}"
+            )
+        else:
+            model = "calibration" if calib else "none (sizes of copies/targets only)"
+        printNLog(f"\nSpeed model for: {prof['outDir'].name}: {model}")
+
+    strtTime = time()
+    metaData = probe([f for f, _ in todo])
+    printNLog(f"\nProbed: {len(todo)} file(s) in: {secsToHMS(time() - strtTime)}")
+
+    records = [
+        planFile(pargs, meta, getKey(f), f, profs, metaData[f], calib, hists, decide)
+        for f, profs in todo
+    ]
+    encodes = [r for r in records if r["status"] == "encode"]
+
+    jobs = max(1, pargs.jobs)
+    encodeTime = sum(r["encodeTime"] or 0 for r in encodes)
+    unknown = sum(r["encodeTime"] is None for r in encodes)
+    unknownSize = sum(r["outBytes"] is None for r in encodes)
+    outBytes = {p["outDir"].name: 0 for p in profiles}
+    for rend in (x for r in encodes for x in r["renditions"]):
+        outBytes[rend["outDir"]] += rend["outBytes"] or 0
+    needs = {p["outDir"]: outBytes[p["outDir"].name] for p in profiles}
+    if pargs.scratch:
+        # what probeStage reserves for the largest files running at once
+        reserved = sorted(
+            (
+                r["inBytes"] * (len(r["renditions"]) + bool(pargs.chunkSize))
+                for r in encodes
+            ),
+            reverse=True,
+        )
+        needs[pargs.scratch.resolve()] = sum(reserved[:jobs])
+    disks = diskNeeds(needs)
+
+    plan = {
+        "host": node(),
+        "date": now(),
+        "jobs": jobs,
+        "totals": {
+            "files": len(files),
+            "done": len(files) - len(todo),
+            "encode": len(encodes),
+            "skip": sum(r["status"] == "skip" for r in records),
+            "error": sum(r["status"] == "error" for r in records),
+            "duration": sum(r["duration"] for r in encodes),
+            "inBytes": sum(r["inBytes"] for r in encodes),
+            "encodeTime": encodeTime,
+            "unknownTime": unknown,
+            "unknownSize": unknownSize,
+            "wallTime": encodeTime / min(jobs, max(1, len(encodes))),
+            "outBytes": outBytes,
+            "disks": disks,
+        },
+        "files": records,
+    }
+    totals = plan["totals"]
+
+    printNLog(
+        f"\nPlan: {totals['encode']} of {totals['files']} file(s) to encode,"
+        f" {secsToHMS(totals['duration'])}/{bytesToMB(totals['inBytes'])} MB,"
+        f" {totals['done']} done, {totals['skip']} to skip"
+        f" and {totals['error']} that couldn't be probed."
+        f"\nEstimated encode time: {secsToHMS(encodeTime)}"
+        f" or {secsToHMS(totals['wallTime'])} with {jobs} job(s)"
+        + (f", N/A for {unknown} file(s)." if unknown else ".")
+    )
+    for dirName, size in totals["outBytes"].items():
+        printNLog(
+            f"\nEstimated output size: {bytesToMB(size)} MB in: {dirName}"
+            + (f", N/A for {unknownSize} file(s)." if unknownSize else ".")
+        )
+    for disk in disks:
+        short = disk["need"] > disk["free"]
+        printNLog(
+            f"\n{'WARNING: not enough space on' if short else 'Space needed on'}:"
+            f" {', '.join(disk['paths'])}: {bytesToMB(disk['need'])} MB"
+            f" of {bytesToMB(disk['free'])} MB free."
+        )
+
+    planOut = Path(pargs.plan or profiles[0]["outDir"].joinpath("plan.json"))
+    planOut.write_text(jDumps(plan, indent=2))
+    printNLog(f"\nPlan written to: {planOut}")
@@ -0,0 +1,124 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import count
+from os import cpu_count
+from time import sleep
+
+# an item source can yield Idle when it has nothing yet but isn't exhausted
+Idle = object()
+
+
+def tryJob(fn, *args):
+    try:
+        return fn(*args)
+    except Exception as jobErr:
+        return jobErr
+
+
+def runStage(fn, prev):
+    # an Exception from an earlier stage is passed on instead of running fn
+    return prev if isinstance(prev, Exception) else tryJob(fn, prev)
+
+
+def runPipeline(
+    stages,
+    items,
+    jobs=1,
+    onDone=None,
+    beforeNext=None,
+    canStart=None,
+    poll=5,
+    depth=1,
+    stopOn=None,
+):
+    """
+    Run every item through three stages (pre, main, post), each fn(previous result).
+    main runs on a bounded pool of `jobs` workers, pre on its own thread for up to
+    `depth` items ahead of them and post on its own thread for the results of
+    main, so workers move on to the next item while post runs. New items aren't
+    started while more than `depth` results are waiting for post.
+    items can be any iterable and is consumed lazily, yielding Idle (nothing yet,
+    more to come) is passed over without blocking.
+    onDone(result) is called in the calling thread in item order, returning True
+    from it stops starting new items; running ones are drained.
+    stopOn(result) is checked on results of main as they finish, True stops
+    starting new items right away instead of once post and onDone got to it.
+    beforeNext() is called before every item started after the first fill.
+    canStart(nRunning) can hold back new items, it is polled every `poll` seconds.
+    A stage raising or returning an Exception skips the later stages for that item.
+    """
+    pre, main, post = stages
+    items = iter(items)
+    seq = count()
+    ahead = deque()  # (n, future of pre) not started on main yet
+    running, posting = {}, {}  # future -> n
+    results = {}  # n -> result waiting for earlier items
+    nextDone = 0
+    stop = exhausted = filled = False
+
+    with ThreadPoolExecutor(max_workers=1) as prePool, ThreadPoolExecutor(
+        max_workers=jobs
+    ) as pool, ThreadPoolExecutor(max_workers=1) as postPool:
+        while True:
+            held = idle = False
+            while not stop:
+                while not (exhausted or idle) and len(ahead) < depth:
+                    item = next(items, None)
+                    if item is None:
+                        exhausted = True
+                    elif item is Idle:
+                        idle = True
+                        break
+                    else:
+                        ahead.append((next(seq), prePool.submit(tryJob, pre, item)))
+                if not ahead or len(running) >= jobs or len(posting) > depth:
+                    break
+                if canStart and not canStart(len(running)):
+                    held = True
+                    break
+                if filled and beforeNext:
+                    beforeNext()
+                n, preFut = ahead.popleft()
+                running[pool.submit(lambda f: runStage(main, f.result()), preFut)] = n
+
+            filled = filled or bool(running)
+
+            if not (running or posting):
+                if held:
+                    sleep(poll)
+                if held or idle or (ahead and not stop):
+                    continue
+                break
+
+            done, _ = wait(
+                [*running, *posting],
+                timeout=0 if idle else poll if held else None,
+                return_when=FIRST_COMPLETED,
+            )
+            for fut in done:
+                if fut in running:
+                    n = running.pop(fut)
+                    if stopOn and stopOn(fut.result()):
+                        stop = True
+                    posting[postPool.submit(runStage, post, fut.result())] = n
+                else:
+                    results[posting.pop(fut)] = fut.result()
+            while nextDone in results:
+                if onDone and onDone(results.pop(nextDone)):
+                    stop = True
+                nextDone += 1
+
+
+def coreCount():
+    # cores this process may run on, which can be less than cpu_count
+    try:
+        from os import sched_getaffinity
+
+        return len(sched_getaffinity(0))
+    except ImportError:
+        return cpu_count() or 1
+
+
+def threadBudget(cores, jobs, encoders=1):
+    # threads for each encoder with `jobs` files encoded at once, `encoders` each
+    return max(1, cores // max(1, jobs * encoders))
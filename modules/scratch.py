@@ -0,0 +1,57 @@
+from os import getpid, kill
+from os import name as osName
+from shutil import disk_usage, rmtree
+from threading import Lock
+
+# bytes set aside for files being encoded into scratch, key -> bytes
+reserved = {}
+reserveLock = Lock()
+
+
+def pidAlive(pid):
+    if osName != "posix":
+        return True  # no harmless way to probe a pid, keep the files
+    try:
+        kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def rmOrphans(scratchDir, prefix):
+    # run directories left behind by killed runs on this host
+    for runDir in scratchDir.glob(f"{prefix}*"):
+        try:
+            pid = int(runDir.name.rsplit("-", 1)[1])
+        except (IndexError, ValueError):
+            continue
+        if pid != getpid() and not pidAlive(pid):
+            rmtree(runDir, ignore_errors=True)
+
+
+def makeScratch(scratchDir, prefix, names):
+    """
+    Per run directory in scratchDir with a sub directory for each of names,
+    orphaned run directories with the same prefix are removed first.
+    """
+    rmOrphans(scratchDir, prefix)
+    runDir = scratchDir.joinpath(f"{prefix}{getpid()}")
+    for name in names:
+        runDir.joinpath(name).mkdir(parents=True, exist_ok=True)
+    return runDir
+
+
+def reserveScratch(runDir, key, need):
+    # False when the free space left after other reservations is less than need
+    with reserveLock:
+        if disk_usage(runDir).free - sum(reserved.values()) < need:
+            return False
+        reserved[key] = need
+        return True
+
+
+def releaseScratch(key):
+    with reserveLock:
+        reserved.pop(key, None)
@@ -0,0 +1,110 @@
+from threading import Lock
+
+etaLock = Lock()
+
+# running count and sum, O(1) per value however long the batch gets
+newStats = lambda: {"n": 0, "sum": 0.0}
+
+meanStat = lambda stats: stats["sum"] / stats["n"] if stats["n"] else 0.0
+
+
+def addStat(stats, val):
+    stats["n"] += 1
+    stats["sum"] += val
+
+
+def newEta():
+    """
+    ETA state: files still to be encoded with their output key (the set of
+    renditions they need), input size and probed duration (None until probed),
+    per key totals of those and the media seconds/encode seconds done per key.
+    """
+    return {
+        "files": {},  # file -> [key, size, media]
+        "pending": {},  # key -> [unprobed bytes, probed media seconds]
+        "speed": {},  # key -> [media seconds, encode seconds]
+        "rate": [0.0, 0.0],  # media seconds, input bytes of encoded files
+    }
+
+
+def dropEntry(eta, file):
+    entry = eta["files"].pop(file, None)
+    if entry:
+        key, size, media = entry
+        pending = eta["pending"][key]
+        if media is None:
+            pending[0] -= size
+        else:
+            pending[1] -= media
+    return entry
+
+
+def putEntry(eta, file, key, size, media):
+    eta["files"][file] = [key, size, media]
+    pending = eta["pending"].setdefault(key, [0, 0.0])
+    if media is None:
+        pending[0] += size
+    else:
+        pending[1] += media
+
+
+def etaPending(eta, file, key, size, media=None):
+    with etaLock:
+        dropEntry(eta, file)
+        putEntry(eta, file, key, size, media)
+
+
+def etaUpdate(eta, file, key=None, media=None):
+    # a pending file's key once its renditions are known or its probed duration
+    with etaLock:
+        entry = dropEntry(eta, file)
+        if entry:
+            putEntry(eta, file, key or entry[0], entry[1], media or entry[2])
+
+
+def etaDrop(eta, file):
+    with etaLock:
+        dropEntry(eta, file)
+
+
+def etaDone(eta, file, media, encodeTime, size):
+    with etaLock:
+        entry = dropEntry(eta, file)
+        if entry:
+            speed = eta["speed"].setdefault(entry[0], [0.0, 0.0])
+            speed[0] += media
+            speed[1] += encodeTime
+        eta["rate"][0] += media
+        eta["rate"][1] += size
+
+
+def etaSeed(eta, key, media, encodeTime, size):
+    # speed learned from earlier runs for a key nothing was measured for yet
+    with etaLock:
+        eta["speed"].setdefault(key, [media, encodeTime])
+        if not eta["rate"][1]:
+            eta["rate"][:] = [media, size]
+
+
+def etaLeft(eta, jobs=1):
+    """
+    (seconds, media seconds) left for the pending files with `jobs` encoding at
+    once. Each key's remaining media duration is divided by the speed (media
+    seconds per encode second) measured for that key, or over all keys for one
+    that hasn't finished a file yet. Unprobed files are counted by their input
+    size at the media seconds per byte seen so far. seconds is None until a
+    speed is known.
+    """
+    with etaLock:
+        mediaDone, bytesDone = eta["rate"]
+        perByte = mediaDone / bytesDone if bytesDone else 0.0
+        allMedia = sum(s[0] for s in eta["speed"].values())
+        allTime = sum(s[1] for s in eta["speed"].values())
+        timeLeft, mediaLeft = 0.0, 0.0
+        for key, (unprobed, media) in eta["pending"].items():
+            media = max(0.0, media + unprobed * perByte)
+            keyMedia, keyTime = eta["speed"].get(key, (allMedia, allTime))
+            if media and timeLeft is not None:
+                timeLeft = timeLeft + media * keyTime / keyMedia if keyMedia else None
+            mediaLeft += media
+        return (None if timeLeft is None else timeLeft / max(1, jobs)), mediaLeft
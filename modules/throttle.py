@@ -0,0 +1,82 @@
+from os import cpu_count
+from pathlib import Path
+from time import time
+
+# readers return None where the source isn't available (non linux, containers)
+
+
+def readLoad():
+    # 1 minute load average per logical core
+    try:
+        load = float(Path("/proc/loadavg").read_text().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return load / (cpu_count() or 1)
+
+
+def readPressure():
+    # share of the last 10 seconds some task was stalled waiting for cpu
+    try:
+        lines = Path("/proc/pressure/cpu").read_text().splitlines()
+        some = dict(kv.split("=") for kv in lines[0].split()[1:])
+        return float(some["avg10"])
+    except (OSError, ValueError, IndexError, KeyError):
+        return None
+
+
+def readTemp():
+    # hottest thermal zone in celsius
+    temps = []
+    for zone in Path("/sys/class/thermal").glob("thermal_zone*/temp"):
+        try:
+            temps.append(int(zone.read_text()) / 1000)
+        except (OSError, ValueError):
+            continue
+    return max(temps) if temps else None
+
+
+def loadWithout(threads):
+    # load per core less what `threads` busy threads of this process account for
+    load = readLoad()
+    return None if load is None else load - threads / (cpu_count() or 1)
+
+
+def hostBusy(maxLoad=None, maxPressure=None, maxTemp=None, ownThreads=0):
+    checks = [
+        ("load per core", lambda: loadWithout(ownThreads), maxLoad),
+        ("cpu pressure", readPressure, maxPressure),
+        ("temperature", readTemp, maxTemp),
+    ]
+    for name, reader, limit in checks:
+        if not limit:
+            continue
+        val = reader()
+        if val is not None and val > limit:
+            return f"{name}: {round(val, 2)} > {limit}"
+    return None
+
+
+def makeThrottle(onBusy, maxWait=600, jobThreads=None, **limits):
+    """
+    Returns canStart(nRunning) for runPipeline, False while the host is over a limit.
+    When nothing is running jobs are held back for at most maxWait seconds.
+    jobThreads() is the threads each running job is expected to keep busy, the
+    load they add is taken off the load average so they don't hold back the next.
+    """
+    since = [None]
+
+    def canStart(nRunning):
+        ownThreads = nRunning * jobThreads() if jobThreads else 0
+        reason = hostBusy(**limits, ownThreads=ownThreads)
+        if reason is None:
+            since[0] = None
+            return True
+        if since[0] is None:
+            since[0] = time()
+            onBusy(reason)
+        if nRunning == 0 and time() - since[0] >= maxWait:
+            since[0] = None
+            return True
+        return False
+
+    return canStart
@@ -0,0 +1,155 @@
+from ctypes import CDLL, get_errno
+from ctypes.util import find_library
+from os import close, read, strerror
+from struct import calcsize, unpack_from
+from sys import platform
+from threading import Lock, Thread
+from time import sleep, time
+
+from .fs import walkFiles
+from .sched import Idle
+
+# inotify(7) event masks
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_Q_OVERFLOW = 0x4000
+IN_ISDIR = 0x40000000
+
+watchMask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+eventHead = "iIII"  # wd, mask, cookie, len
+eventSize = calcsize(eventHead)
+
+
+def initInotify():
+    # returns (libc, fd) or None where inotify isn't available
+    if not platform.startswith("linux"):
+        return None
+    try:
+        libc = CDLL(find_library("c"), use_errno=True)
+        fd = libc.inotify_init()
+    except (OSError, AttributeError):
+        return None
+    return (libc, fd) if fd >= 0 else None
+
+
+def addCandidate(watch, path):
+    with watch["lock"]:
+        if (
+            path.suffix.lower() in watch["exts"]
+            and path not in watch["seen"]
+            and path not in watch["candidates"]
+        ):
+            watch["candidates"][path] = [-1, time()]
+
+
+def scanWatched(watch):
+    skipDir = watch["skipDir"] if watch["recursive"] else (lambda d: True)
+    for path in walkFiles(watch["dirPath"], watch["exts"], skipDir):
+        addCandidate(watch, path)
+
+
+def addWatch(watch, dirPath):
+    libc, fd = watch["inotify"]
+    wd = libc.inotify_add_watch(fd, str(dirPath).encode(), watchMask)
+    if wd < 0:
+        raise OSError(get_errno(), strerror(get_errno()), str(dirPath))
+    watch["wds"][wd] = dirPath
+    if watch["recursive"]:
+        for sub in dirPath.iterdir():
+            if sub.is_dir() and not sub.is_symlink() and not watch["skipDir"](sub):
+                addWatch(watch, sub)
+
+
+def readEvents(watch):
+    _, fd = watch["inotify"]
+    while True:
+        buf = read(fd, 1 << 16)
+        offset = 0
+        while offset < len(buf):
+            wd, mask, _, length = unpack_from(eventHead, buf, offset)
+            name = buf[offset + eventSize : offset + eventSize + length]
+            offset += eventSize + length
+            if mask & IN_Q_OVERFLOW:
+                scanWatched(watch)  # events were dropped
+                continue
+            if wd not in watch["wds"]:
+                continue
+            path = watch["wds"][wd].joinpath(name.rstrip(b"\0").decode())
+            if not mask & IN_ISDIR:
+                addCandidate(watch, path)
+            elif watch["recursive"] and not watch["skipDir"](path):
+                try:
+                    addWatch(watch, path)
+                    for file in walkFiles(path, watch["exts"], watch["skipDir"]):
+                        addCandidate(watch, file)
+                except OSError:
+                    continue  # directory is already gone
+
+
+def pollWatched(watch):
+    while True:
+        sleep(watch["poll"])
+        scanWatched(watch)
+
+
+def startWatch(watch):
+    target = pollWatched
+    if watch["inotify"]:
+        try:
+            addWatch(watch, watch["dirPath"])
+            target = readEvents
+        except OSError:
+            close(watch["inotify"][1])
+            watch["inotify"] = None
+    Thread(target=target, args=(watch,), name="watcher", daemon=True).start()
+    scanWatched(watch)  # anything that arrived before the watch was set up
+
+
+def settled(watch):
+    # candidates that kept the same size for settle seconds
+    now, done = time(), []
+    with watch["lock"]:
+        for path, state in list(watch["candidates"].items()):
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                del watch["candidates"][path]
+                continue
+            if size != state[0]:
+                state[:] = [size, now]
+            elif now - state[1] >= watch["settle"]:
+                del watch["candidates"][path]
+                watch["seen"].add(path)
+                done.append(path)
+    return sorted(done)
+
+
+def watchFiles(dirPath, exts, recursive, skipDir, known, settle=30, poll=10, tick=1):
+    """
+    Endless generator of new files under dirPath once they stopped growing for
+    settle seconds, from inotify events or polling every poll seconds where
+    inotify isn't available. Yields Idle every tick seconds while nothing is ready.
+    """
+    watch = {
+        "dirPath": dirPath,
+        "exts": exts,
+        "recursive": recursive,
+        "skipDir": skipDir,
+        "settle": settle,
+        "poll": poll,
+        "seen": set(known()),
+        "candidates": {},  # path -> [size, time size last changed]
+        "wds": {},
+        "lock": Lock(),
+        "inotify": initInotify(),
+    }
+    startWatch(watch)
+    while True:
+        ready = settled(watch)
+        yield from ready
+        if not ready:
+            sleep(tick)
+            yield Idle
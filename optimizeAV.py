@@ -1,41 +1,31 @@
 import argparse
-import atexit
 from functools import partial
+from os import cpu_count
 from pathlib import Path
-from shlex import join as shJoin
-from statistics import fmean
-from sys import version_info
-from time import time
-
-# from os import cpu_count
-
-from modules.ffUtils.ffmpeg import getffmpegCmd, optsVideo, selectCodec
-from modules.ffUtils.ffprobe import (
-    compareDur,
-    formatParams,
-    getMeta,
-    getMetaData,
-    getFormatData,
-)
-from modules.fs import cleanUp, getFileList, getFileListRec, makeTargetDirs
-from modules.helpers import (
-    bytesToMB,
-    dynWait,
-    fileDTime,
-    nothingExit,
-    round2,
-    secsToHMS,
-)
-from modules.io import printNLog, reportErr, startMsg, statusInfo, waitN
-from modules.os import checkPaths, runCmd
-from modules.pkgState import setLogFile
-from modules.cli import checkDirPath, checkValIn
-
-
-def parseArgs():
+
+from modules.cli import checkDirPath, checkProfile, checkThreads, checkValIn
+
+# the rest is imported in main once there is something to do and optional
+# features only import their modules when enabled, for a quick --help/no-op run
+
+
+def parseArgs(argv=None):
 
     aCodec = partial(checkValIn, ["opus", "he", "aac", "ac"], str)
     vCodec = partial(checkValIn, ["avc", "hevc", "av1", "vn", "vc"], str)
+    profile = partial(
+        checkProfile,
+        {
+            "ca": aCodec,
+            "qa": int,
+            "cv": vCodec,
+            "qv": int,
+            "s": str,
+            "rs": int,
+            "fr": int,
+            "n": str,
+        },
+    )
 
     parser = argparse.ArgumentParser(
         description="Optimize Video/Audio files by encoding to avc/hevc/aac/opus."
@@ -110,223 +100,1392 @@ def parseArgs():
         type=int,
         help="Audio Quality/bitrate in kbps; (defaults:: opus: 48, he: 56 and aac: 72)",
     )
+    parser.add_argument(
+        "-op",
+        "--outProfile",
+        action="append",
+        default=[],
+        type=profile,
+        help="Add an output rendition encoded from the same decode, given as "
+        "comma separated overrides of ca, qa, cv, qv, s, rs and fr, plus n for "
+        "the name of its out-<ext>-<n> directory, e.g. -op ca=opus -op rs=480,qv=30."
+        " Can be repeated.",
+    )
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument(
+        "-ts",
+        "--targetSize",
+        default=None,
+        type=float,
+        help="Target output size in MB per file; the video crf is picked by "
+        "encoding short samples at trial crfs. Overrides -qv.",
+    )
+    target.add_argument(
+        "-tb",
+        "--targetBpp",
+        default=None,
+        type=float,
+        help="Target video bits per pixel per frame (at the output resolution and "
+        "frame rate), e.g. 0.05; crf is picked like -ts. Overrides -qv.",
+    )
+    parser.add_argument(
+        "-dc",
+        "--decide",
+        action="store_true",
+        help="Copy streams that are already efficient instead of re-encoding them "
+        "and skip files where every stream would be copied.",
+    )
+    parser.add_argument(
+        "-mb",
+        "--maxBpp",
+        default=0.1,
+        type=float,
+        help="Decide: max video bits per pixel per frame for a stream in an "
+        "efficient codec to be copied. (default: 0.1)",
+    )
+    parser.add_argument(
+        "-ma",
+        "--maxAudio",
+        default=None,
+        type=float,
+        help="Decide: max audio bitrate in kbps for a stream in an efficient codec "
+        "to be copied. (default: selected audio bitrate)",
+    )
+    parser.add_argument(
+        "-sc",
+        "--scratch",
+        default=None,
+        type=checkDirPath,
+        help="Write temporary outputs to this directory, e.g. on a local ssd or "
+        "tmpfs, and copy them to the output directory once encoded; files that "
+        "wouldn't fit fall back to the output directory.",
+    )
     parser.add_argument(
         "-fm",
         "--format",
         action="store_true",
         help="Use metadata from container format for duration comparison.",
     )
-    # parser.add_argument(
-    #     "-j",
-    #     "--jobs",
-    #     default=cpu_count(),
-    #     type=int,
-    #     help="Number of jobs to be run in parallel by encoder for Multi-Processing. "
-    #     "(Default: Number of logical cores available)"
-    #     "(Only supported by Video Encoders)",
-    # )
-    return parser.parse_args()
+    parser.add_argument(
+        "-nc",
+        "--noCache",
+        action="store_true",
+        help="Bypass the ffprobe metadata cache kept in the output directory.",
+    )
+    parser.add_argument(
+        "-rc",
+        "--rebuildCache",
+        action="store_true",
+        help="Discard and rebuild the ffprobe metadata cache.",
+    )
+    parser.add_argument(
+        "-hd",
+        "--historyDb",
+        default=None,
+        type=Path,
+        help="Keep host, codec args, output resolution/fps, duration, wall time "
+        "and bytes in/out of every encoded file in this sqlite database; speeds "
+        "learned from it seed the ETA and -pl, see history.py for reports. "
+        "(default: ~/.optimizeAV/perf.db)",
+    )
+    parser.add_argument(
+        "-nh",
+        "--noHistory",
+        action="store_true",
+        help="Don't read or write the performance history database.",
+    )
+    parser.add_argument(
+        "-pp",
+        "--preProbe",
+        nargs="?",
+        default=None,
+        const=8,
+        type=int,
+        help="Probe all files concurrently with n threads before encoding starts. "
+        "(default: off, -pp without a value: 8)",
+    )
+    parser.add_argument(
+        "-ls",
+        "--logSize",
+        default=None,
+        type=int,
+        help="Rotate the log file once it grows past n MB, keeping 3 old logs. "
+        "(default: no rotation)",
+    )
+    parser.add_argument(
+        "-pi",
+        "--progress",
+        default=10,
+        type=int,
+        help="Show encoding progress every n seconds, 0 disables it. (default: 10)",
+    )
+    parser.add_argument(
+        "-t",
+        "--throttle",
+        action="store_true",
+        help="Replace the fixed wait between files with load aware throttling; "
+        "new jobs start as soon as the host is within the limits below.",
+    )
+    parser.add_argument(
+        "-ml",
+        "--maxLoad",
+        default=1.0,
+        type=float,
+        help="Throttle: max 1 minute load average per logical core. (default: 1.0)",
+    )
+    parser.add_argument(
+        "-mp",
+        "--maxPressure",
+        default=40.0,
+        type=float,
+        help="Throttle: max cpu pressure (/proc/pressure/cpu some avg10 %%). "
+        "(default: 40)",
+    )
+    parser.add_argument(
+        "-mt",
+        "--maxTemp",
+        default=None,
+        type=float,
+        help="Throttle: max thermal zone temperature in celsius. (default: off)",
+    )
+    parser.add_argument(
+        "-cs",
+        "--chunkSize",
+        default=None,
+        type=int,
+        help="Split videos longer than twice n seconds into ~n second chunks at "
+        "keyframes and encode the chunks in parallel. (default: off)",
+    )
+    parser.add_argument(
+        "-cj",
+        "--chunkJobs",
+        default=4,
+        type=int,
+        help="Number of chunks to be encoded in parallel per file. (default: 4)",
+    )
+    parser.add_argument(
+        "-th",
+        "--threads",
+        nargs="?",
+        default=None,
+        const="auto",
+        type=checkThreads,
+        help="Threads per job, split between the job's video encoders (renditions "
+        "or chunks) and passed as -threads, x265 pools, svt-av1 lp and "
+        "-filter_threads; auto splits the available cores between the jobs "
+        "running at once, off leaves it to the encoders. (default: auto with "
+        "more than one job, otherwise off, -th without a value: auto)",
+    )
+    parser.add_argument(
+        "-pl",
+        "--plan",
+        nargs="?",
+        default=None,
+        const="",
+        type=str,
+        help="Dry run: probe the files that aren't done yet and write a json "
+        "forecast of encode time, output size and disk space needed to this file "
+        "without encoding anything. Speeds come from earlier runs with the same "
+        "settings (history database or manifest) or from -cb. "
+        "(-pl without a value: plan.json in the output directory)",
+    )
+    parser.add_argument(
+        "-cb",
+        "--calibration",
+        default=None,
+        type=Path,
+        help="Plan: benchmark.py report (-o) from this host, used for profiles "
+        "that have no earlier runs.",
+    )
+    parser.add_argument(
+        "-mf",
+        "--metrics",
+        nargs="?",
+        default=None,
+        const="",
+        type=str,
+        help="Append a json record per file to this file. "
+        "(-mf without a value: metrics.jsonl in the output directory)",
+    )
+    parser.add_argument(
+        "-pf",
+        "--promFile",
+        default=None,
+        type=Path,
+        help="Write batch totals to this prometheus textfile, e.g. in "
+        "node_exporter's textfile collector directory.",
+    )
+    parser.add_argument(
+        "-sh",
+        "--share",
+        action="store_true",
+        help="Share the directory with other hosts running with -sh; each file is "
+        "claimed through a lease file in the output directory before encoding.",
+    )
+    parser.add_argument(
+        "-lt",
+        "--leaseTime",
+        default=300,
+        type=int,
+        help="Seconds after which a lease that hasn't been renewed (crashed host) "
+        "can be claimed by another host. (default: 300)",
+    )
+    parser.add_argument(
+        "-wa",
+        "--watch",
+        action="store_true",
+        help="Keep running after the initial scan and encode new or moved in files "
+        "as they appear (inotify on linux, polling elsewhere).",
+    )
+    parser.add_argument(
+        "-st",
+        "--settle",
+        default=30,
+        type=int,
+        help="Watch: seconds a new file has to stop growing before it is encoded. "
+        "(default: 30)",
+    )
+    parser.add_argument(
+        "-wp",
+        "--watchPoll",
+        default=10,
+        type=int,
+        help="Watch: seconds between directory scans when inotify isn't available. "
+        "(default: 10)",
+    )
+    parser.add_argument(
+        "-or",
+        "--order",
+        default="walk",
+        choices=["walk", "path", "newest", "longest", "shortest"],
+        help="Order files are encoded in; walk: as the directory walk finds them "
+        "(starts right away), path: natural path order, newest: last modified "
+        "first, longest/shortest: largest/smallest probed duration x output pixel "
+        "rate first (probes every file up front like -pp). With parallel jobs "
+        "longest keeps every job busy until the end of the batch. (default: walk)",
+    )
+    parser.add_argument(
+        "-pr",
+        "--priority",
+        nargs="+",
+        default=[],
+        type=str,
+        help="Encode files whose path relative to dir matches one of these glob "
+        "patterns first, in pattern order, each group in -or order, "
+        "e.g. -pr 'new/*' '*.mkv'.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        nargs="?",
+        default=1,
+        const=cpu_count(),
+        type=int,
+        help="Number of files to be encoded in parallel, each job gets its own "
+        "temporary file and log section. (default: 1, -j without a value: "
+        "number of logical cores available)",
+    )
+    args = parser.parse_args(argv)
+    if args.outProfile and (
+        args.chunkSize or args.targetSize or args.targetBpp or args.decide
+    ):
+        parser.error("-op can't be combined with -cs, -ts, -tb or -dc")
+    if args.cVideo == "vn" and any(p.get("cv", "vn") != "vn" for p in args.outProfile):
+        parser.error("-op: profiles for audio files (-cv vn) can't have video")
+    if args.plan is not None and args.watch:
+        parser.error("-pl can't be combined with -wa")
+    if args.threads is None and args.jobs > 1:
+        # parallel jobs would otherwise each size their encoders to every core
+        args.threads = "auto"
+    if args.threads == "off":
+        args.threads = None
+    return args
+
+
+def main(argv=None):
+
+    pargs = parseArgs(argv)
+
+    from modules.fs import getFileList, walkFiles
+    from modules.os import checkPaths
+
+    ffprobePath, ffmpegPath = checkPaths(
+        {
+            "ffprobe": r"C:\ffmpeg\bin\ffprobe.exe",
+            "ffmpeg": r"C:\ffmpeg\bin\ffmpeg.exe",
+        }
+    )
+
+    noVideo = True if pargs.cVideo == "vn" else False
 
+    if noVideo:
+
+        formats = [".flac", ".wav", ".m4a", ".mp3"]
+
+    else:
 
-pargs = parseArgs()
+        formats = [".mp4", ".mov", ".mkv", ".webm", ".avi", ".wmv", ".flv", ".3gp"]
 
-ffprobePath, ffmpegPath = checkPaths(
-    {
-        "ffprobe": r"C:\ffmpeg\bin\ffprobe.exe",
-        "ffmpeg": r"C:\ffmpeg\bin\ffmpeg.exe",
+    meta = {
+        "basic": ["codec_type", "codec_name", "profile", "duration", "bit_rate"],
+        "audio": ["channels", "sample_rate"],
+        "video": ["width", "height", "r_frame_rate"],
     }
-)
 
-noVideo = True if pargs.cVideo == "vn" else False
+    dirPath = pargs.dir.resolve()
 
-if noVideo:
+    skipOut = lambda d: d.name.startswith("out-")
 
-    formats = [".flac", ".wav", ".m4a", ".mp3"]
+    if pargs.recursive:
+        getFilePaths = lambda dirPath, exts: walkFiles(dirPath, exts, skipOut)
+    else:
+        getFilePaths = getFileList
+
+    fileIter = iter(getFilePaths(dirPath, formats))
+
+    firstFile = next(fileIter, None)
+
+    if firstFile is None and not pargs.watch:
+        print("Nothing to do.")
+        return
+
+    import atexit
+    from itertools import chain
+    from json import dumps as jDumps
+    from os import getpid
+    from platform import node
+    from shlex import join as shJoin
+    from sys import exit
+    from time import time
+
+    from modules.ffUtils.ffmpeg import (
+        copied,
+        getffmpegCmd,
+        getffmpegMultiCmd,
+        optsVideo,
+        presetOf,
+        runffmpeg,
+        selectCodec,
+        toFloat,
+    )
+    from modules.ffUtils.ffprobe import (
+        compareDur,
+        formatParams,
+        getMeta,
+        getDuration,
+        getMetaDataCached,
+        getFormatData,
+        probeAll,
+    )
+    from modules.ffUtils.metaCache import closeCache, openCache
+    from modules.fs import cleanUp, makeTargetDirs, publishFile
+    from modules.helpers import bytesToMB, dynWait, fileDTime, now, round2, secsToHMS
+    from modules.io import (
+        endSection,
+        printNLog,
+        progressInfo,
+        reportErr,
+        startMsg,
+        startSection,
+        statusInfo,
+        waitN,
+        writeLog,
+    )
+    from modules.manifest import addEntry, isDone, loadManifest, makeEntry
+    from modules.pkgState import setLogFile
+    from modules.sched import Idle, coreCount, runPipeline, threadBudget
+    from modules.stats import (
+        addStat,
+        etaDone,
+        etaDrop,
+        etaLeft,
+        etaPending,
+        etaSeed,
+        etaUpdate,
+        meanStat,
+        newEta,
+        newStats,
+    )
 
-    outExt = ".opus" if pargs.cAudio == "opus" else ".m4a"
-else:
+    def makeProfile(opts, taken):
+        """
+        Output rendition from the base arguments with opts (-op) applied, each with
+        its own out-<ext> directory, manifest and codec settings.
+        """
+        cAudio, cVideo = opts.get("ca", pargs.cAudio), opts.get("cv", pargs.cVideo)
+        if cVideo == "vn":
+            ext = ".opus" if cAudio == "opus" else ".m4a"
+        else:
+            ext = ".mp4"
+
+        name = f"out-{ext[1:]}"
+        if "n" in opts:
+            name = f"{name}-{opts['n']}"
+        elif name in taken:
+            name = f"{name}-{'-'.join(str(v) for v in opts.values())}"
+        if name in taken:
+            exit(f"Output profiles can't share the directory: {name}")
+
+        prof = {
+            "ext": ext,
+            "outDir": makeTargetDirs(dirPath, [name])[0],
+            "cVideo": cVideo,
+            "qVideo": opts.get("qv", pargs.qVideo),
+            "speed": opts.get("s", pargs.speed),
+            "ca": selectCodec(cAudio, opts.get("qa", pargs.qAudio)),
+            "cAudio": cAudio,
+            "res": opts.get("rs", pargs.res),
+            "fps": opts.get("fr", pargs.fps),
+        }
+        prof["cv"] = selectCodec(cVideo, prof["qVideo"], prof["speed"])
+        prof["settings"] = {
+            "cv": prof["cv"],
+            "ca": prof["ca"],
+            "res": prof["res"],
+            "fps": prof["fps"],
+        }
+        prof["outFiles"] = set(getFilePaths(prof["outDir"], [ext]))
+        prof["manifestFile"] = prof["outDir"].joinpath("manifest.jsonl")
+        prof["manifest"] = loadManifest(prof["manifestFile"])
+        return prof
+
+    profiles = []
+    for opts in [{}, *pargs.outProfile]:
+        profiles.append(makeProfile(opts, [p["outDir"].name for p in profiles]))
+
+    outDir = profiles[0]["outDir"]
+    setLogFile(
+        outDir.joinpath(f"{dirPath.name}.log"),
+        pargs.logSize << 20 if pargs.logSize else None,
+    )
 
-    formats = [".mp4", ".mov", ".mkv", ".webm", ".avi", ".wmv", ".flv", ".3gp"]
+    if pargs.metrics is not None or pargs.promFile:
+        from modules.metrics import writeProm, writeRecord
+
+    if pargs.metrics is not None:
+        pargs.metrics = Path(pargs.metrics or outDir.joinpath("metrics.jsonl"))
+
+    fileList = []  # files discovered so far, grows while the walk continues
+    scanDone = False
+
+    # files count towards the ETA under every profile until pendingFiles has
+    # checked which renditions they still need
+    eta = newEta()
+    targetsKey = lambda targets: "+".join(p["outDir"].name for p, _ in targets)
+    allTargets = targetsKey([(p, None) for p in profiles])
+
+    def trackFiles(source):
+        for file in source:
+            if file is not Idle:
+                # a dangling link, or a file removed since the walk found it
+                try:
+                    size = file.stat().st_size
+                except OSError as err:
+                    printNLog(f"\nSkipping: {file}, can't read it: {err.strerror}.")
+                    continue
+                fileList.append(file)
+                etaPending(eta, file, allTargets, size)
+            yield file
+
+    def scanFiles():
+        nonlocal scanDone
+        yield from trackFiles(chain([firstFile] if firstFile else [], fileIter))
+        scanDone = True
+
+    def watchNew():
+        printNLog(f"\nWatching: {dirPath} for new files.")
+        yield from trackFiles(
+            watchFiles(
+                dirPath,
+                formats,
+                pargs.recursive,
+                skipOut,
+                lambda: fileList,
+                pargs.settle,
+                pargs.watchPoll,
+            )
+        )
+
+    nFiles = lambda: str(len(fileList)) if scanDone else f"{len(fileList)}+"
+
+    tmpFiles = []
+    scratchDirs = []
+
+    if pargs.scratch:
+        from modules.scratch import makeScratch, releaseScratch, reserveScratch
+
+        scratchDirs.append(
+            makeScratch(
+                pargs.scratch.resolve(),
+                f"{Path(__file__).stem}-{node()}-",
+                [p["outDir"].name for p in profiles],
+            )
+        )
 
-    outExt = ".mp4"
+    atexit.register(cleanUp, [p["outDir"] for p in profiles], tmpFiles, scratchDirs)
 
-meta = {
-    "basic": ["codec_type", "codec_name", "profile", "duration", "bit_rate"],
-    "audio": ["channels", "sample_rate"],
-    "video": ["height", "r_frame_rate"],
-}
+    startMsg()
 
-dirPath = pargs.dir.resolve()
+    for prof in profiles[1:]:
+        printNLog(
+            f"\nOutput profile: {prof['outDir'].name}: {shJoin([*prof['cv'], *prof['ca']])}"
+        )
 
-if pargs.recursive:
-    getFilePaths = getFileListRec
-else:
-    getFilePaths = getFileList
+    tmpTag = ""
 
-fileList = getFilePaths(dirPath, formats)
+    if pargs.share:
+        from modules.lease import claimLease, releaseAll, releaseLease
 
-if not fileList:
-    nothingExit()
+        owner = f"{node()}:{getpid()}"
+        tmpTag = f"{node()}-"
+        leaseDir = makeTargetDirs(outDir, [".leases"])[0]
+        atexit.register(releaseAll)
 
-outDir = makeTargetDirs(dirPath, [f"out-{outExt[1:]}"])[0]
-tmpFile = outDir.joinpath(f"tmp-{fileDTime()}{outExt}")
-setLogFile(outDir.joinpath(f"{dirPath.name}.log"))
+    # outFiles has what was there at the start and what this host published,
+    # anything else was published by another host, no clocks to compare
+    publishedElsewhere = lambda prof, outFile: (
+        outFile not in prof["outFiles"] and outFile.exists()
+    )
 
-if pargs.recursive:
-    if version_info >= (3, 9):
-        fileList = [f for f in fileList if not f.is_relative_to(outDir)]
+    if pargs.noCache:
+        metaCache = None
     else:
-        fileList = [f for f in fileList if not (str(outDir) in str(f))]
+        # sqlite locking isn't reliable over network filesystems, one db per host
+        cacheName = f"metaCache-{node()}.db" if pargs.share else "metaCache.db"
+        metaCache = openCache(outDir.joinpath(cacheName), pargs.rebuildCache)
+        atexit.register(closeCache, metaCache)
 
-outFileList = getFilePaths(outDir, [outExt])
+    if pargs.noHistory:
+        perfDb = None
+    else:
+        from modules.ffUtils.decide import toFps
+        from modules.perfDb import addJob, closeDb, defaultDb, learned, openDb
 
-atexit.register(cleanUp, [outDir], [tmpFile])
+        perfDb = openDb(pargs.historyDb or defaultDb())
+        atexit.register(closeDb, perfDb)
 
-startMsg()
+    # jobs are looked up in the history by their renditions' settings
+    settingsKey = lambda profs: jDumps([p["settings"] for p in profs], sort_keys=True)
 
-getMetaDataP = partial(getMetaData, ffprobePath)
+    getMetaDataP = partial(getMetaDataCached, ffprobePath, metaCache)
 
-totalTime, inSizes, outSizes, lengths = ([] for i in range(4))
+    getOutFile = lambda file, prof: prof["outDir"].joinpath(
+        file.relative_to(dirPath).with_suffix(prof["ext"])
+    )
 
-for idx, file in enumerate(fileList):
+    getKey = lambda file: file.relative_to(dirPath).as_posix()
 
-    outFile = Path(outDir.joinpath(file.relative_to(dirPath).with_suffix(outExt)))
+    ca, cv, settings = (profiles[0][k] for k in ["ca", "cv", "settings"])
 
-    statusInfoP = partial(statusInfo, idx=f"{idx+1}/{len(fileList)}", file=file)
+    from modules.ffUtils.crf import getBitrate
 
-    if any(outFileList) and outFile in outFileList:
-        statusInfoP("Skipping")
-        continue
+    targetMode = bool(pargs.targetSize or pargs.targetBpp)
+    if targetMode:
+        from modules.ffUtils.crf import outDims, searchCrf, targetRate
 
-    statusInfoP("Processing")
+        settings["target"] = [pargs.targetSize, pargs.targetBpp]
 
-    metaDataIn = getMetaDataP(file)
-    if isinstance(metaDataIn, Exception):
-        reportErr(metaDataIn)
-        break
+    def isComplete(file, prof):
+        manifest, outFile = prof["manifest"], getOutFile(file, prof)
+        done = isDone(manifest, getKey(file), file, prof["settings"])
+        if done is None:
+            # outputs from runs before the manifest existed are kept
+            return outFile in prof["outFiles"]
+        skipped = manifest[getKey(file)]["result"] == "skipped"
+        return done and (skipped or outFile in prof["outFiles"])
 
-    getMetaP = partial(getMeta, metaDataIn, meta)
+    if pargs.decide:
+        from modules.ffUtils.decide import decideAudio, decideVideo
 
-    adoInParams = getMetaP("audio")
+        settings["decide"] = [pargs.maxBpp, pargs.maxAudio]
 
-    ov = []
+    def decideStreams(metaData, vdoParams, adoParams):
+        # per stream re-encode or copy, logged with the reason
+        fileCv, fileCa = cv, ca
 
-    if not noVideo:
-        vdoInParams = getMetaP("video")
+        if not pargs.cAudio == "ac":
+            maxKbps = pargs.maxAudio or (getBitrate(ca) or 0) / 1000
+            act, reason = decideAudio(adoParams, pargs.cAudio, maxKbps)
+            printNLog(f"\nAudio decision: {act}, {reason}")
+            if act == "copy":
+                fileCa = selectCodec("ac")
 
-        if not pargs.cVideo == "vc":
-            ov = optsVideo(
-                vdoInParams["height"], vdoInParams["r_frame_rate"], pargs.res, pargs.fps
+        if vdoParams and pargs.cVideo not in ("vc", "vn"):
+            # no format bit_rate without a duration, unknown rather than negative
+            fallbackKbps = max(
+                0,
+                toFloat(metaData["format"].get("bit_rate")) / 1000
+                - toFloat(adoParams.get("bit_rate")),
             )
+            act, reason = decideVideo(
+                vdoParams,
+                pargs.cVideo,
+                pargs.res,
+                pargs.fps,
+                pargs.maxBpp,
+                fallbackKbps,
+            )
+            printNLog(f"\nVideo decision: {act}, {reason}")
+            if act == "copy":
+                fileCv = selectCodec("vc")
 
-    ca = selectCodec(pargs.cAudio, pargs.qAudio)
-    cv = selectCodec(pargs.cVideo, pargs.qVideo, pargs.speed)
-    cmd = getffmpegCmd(ffmpegPath, file, tmpFile, ca, cv, ov)
-
-    printNLog(f"\n{shJoin(cmd)}")
-    strtTime = time()
-    cmdOut = runCmd(cmd)
-    if isinstance(cmdOut, Exception):
-        reportErr(cmdOut)
-        break
-    timeTaken = time() - strtTime
-    totalTime.append(timeTaken)
+        return fileCv, fileCa
 
-    printNLog(cmdOut)
-    if pargs.recursive and not outFile.parent.exists():
-        outFile.parent.mkdir(parents=True)
+    def decideFile(metaData, vdoParams, adoParams):
+        # decideStreams, None when every stream would only be copied
+        fileCv, fileCa = decideStreams(metaData, vdoParams, adoParams)
+        if copied(fileCv, noVideo) and copied(fileCa) and (fileCv, fileCa) != (cv, ca):
+            return None
+        return fileCv, fileCa
 
-    tmpFile.rename(outFile)
+    if pargs.plan is not None:
+        from modules.plan import planFiles
 
-    statusInfoP("Processed")
+        learnedFor = lambda prof: perfDb is not None and learned(
+            perfDb, node(), settingsKey([prof])
+        )
+        allFiles = list(scanFiles())
+        todo = [(f, [p for p in profiles if not isComplete(f, p)]) for f in allFiles]
+        planFiles(
+            pargs,
+            meta,
+            profiles,
+            allFiles,
+            [(f, profs) for f, profs in todo if profs],
+            partial(
+                probeAll, ffprobePath, metaCache, threads=max(1, pargs.preProbe or 8)
+            ),
+            getKey,
+            learnedFor,
+            decideFile if pargs.decide else None,
+        )
+        return
+
+    def fileCost(file):
+        # probed duration x output pixel rate of the renditions still to do
+        metaData = probed.get(file)
+        if not isinstance(metaData, dict):
+            return 0
+        duration = getDuration(metaData)
+        if noVideo:
+            return duration
+        vdoParams = getMeta(metaData, meta, "video")
+        return duration * sum(
+            outPixRate(vdoParams, p["res"], p["fps"]) or 1
+            for p in profiles
+            if not isComplete(file, p)
+        )
 
-    metaDataOut = getMetaDataP(outFile)
-    if isinstance(metaDataOut, Exception):
-        reportErr(metaDataOut)
-        break
+    def orderFiles(files):
+        """
+        files sorted by -or, then moved up by the first -pr pattern they match,
+        the sorts are stable so each priority group keeps the -or order.
+        """
+        if pargs.order == "path":
+            files = (deepPathSort if pargs.recursive else nPathSort)(files)
+        elif pargs.order == "newest":
+            files = sorted(files, key=lambda f: f.stat().st_mtime, reverse=True)
+        elif costOrder:
+            files = sorted(files, key=fileCost, reverse=pargs.order == "longest")
+        rank = lambda file: next(
+            (
+                i
+                for i, pattern in enumerate(pargs.priority)
+                if fnmatch(getKey(file), pattern)
+            ),
+            len(pargs.priority),
+        )
+        return sorted(files, key=rank)
 
-    getMetaP = partial(getMeta, metaDataOut, meta)
+    probed = {}
 
-    if not noVideo:
+    files = scanFiles()
 
-        vdoOutParams = getMetaP("video")
+    costOrder = pargs.order in ("longest", "shortest")
 
+    if pargs.preProbe or costOrder:
+        files = list(files)
+        strtTime = time()
+        probed = probeAll(
+            ffprobePath,
+            metaCache,
+            [f for f in files if not all(isComplete(f, p) for p in profiles)],
+            max(1, pargs.preProbe or 8),
+        )
+        totalDur = 0
+        for file, metaData in probed.items():
+            if isinstance(metaData, dict):
+                etaUpdate(eta, file, media=getDuration(metaData))
+                totalDur += getDuration(metaData)
         printNLog(
-            f"\nVideo Input:: {formatParams(vdoInParams)}"
-            f"\nVideo Output:: {formatParams(vdoOutParams)}"
+            f"\nProbed: {len(probed)} file(s) in: {secsToHMS(time() - strtTime)}"
+            f" for total duration: {secsToHMS(totalDur)}."
         )
 
-    adoOutParams = getMetaP("audio")
+    if pargs.order != "walk" or pargs.priority:
+        from fnmatch import fnmatch
+
+        from modules.fs import deepPathSort, nPathSort
+        from modules.plan import outPixRate
+
+        files = orderFiles(list(files))
+
+    if pargs.watch:
+        from modules.watch import watchFiles
 
-    printNLog(
-        f"\nAudio Input:: {formatParams(adoInParams)}"
-        f"\nAudio Output:: {formatParams(adoOutParams)}"
+        files = chain(files, watchNew())
+
+    totals = {key: newStats() for key in ["inSize", "outSize", "timeTaken", "length"]}
+
+    jobs = max(1, pargs.jobs)
+
+    cores = coreCount()
+
+    # files being encoded at once, fewer than jobs once the last files are running
+    inFlight = lambda: (
+        min(
+            jobs,
+            max(
+                1, len(fileList) - totals["timeTaken"]["n"] - len(skipped) - len(failed)
+            ),
+        )
+        if scanDone
+        else jobs
     )
 
-    getFormatDataIn = partial(getFormatData, metaDataIn)
-    getFormatDataOut = partial(getFormatData, metaDataOut)
+    def encoderThreads(encoders):
+        # threads for each of a job's video encoders, None leaves it to the encoders
+        if pargs.threads is None:
+            return None
+        if pargs.threads == "auto":
+            return threadBudget(cores, inFlight(), encoders)
+        return threadBudget(pargs.threads, 1, encoders)
+
+    if pargs.chunkSize:
+        from modules.ffUtils.chunk import encodeChunked
+
+    useChunks = lambda duration: (
+        pargs.chunkSize
+        and not noVideo
+        and pargs.cVideo != "vc"
+        and duration > pargs.chunkSize * 2
+    )
 
-    if pargs.format:
+    def fileStage(stage, job):
+        """
+        Run stage(job) with its messages held in the job's log, a stage returns None
+        to go on or the file's result, an Exception or {"skipped": True} ends it.
+        """
+        if "res" in job:
+            return job
+        startSection(job["log"])
+        try:
+            res = stage(job)
+        except Exception as stageErr:
+            res = stageErr
+        finally:
+            endSection(flush=False)
+        if res is not None:
+            job["res"] = res
+        return job
+
+    def probeStage(item):
+
+        idx, file, targets = item
+
+        tmpDir = lambda prof: prof["outDir"]
+        if scratchDirs:
+            # room for every rendition plus the split source when chunking
+            need = file.stat().st_size * (len(targets) + bool(pargs.chunkSize))
+            if reserveScratch(scratchDirs[0], getKey(file), need):
+                tmpDir = lambda prof: scratchDirs[0].joinpath(prof["outDir"].name)
+            else:
+                printNLog(
+                    f"\nNot enough space in: {pargs.scratch} for: {file.name},"
+                    " encoding in the output directory."
+                )
+
+        renditions = []
+        for prof, outFile in targets:
+            tmpFile = tmpDir(prof).joinpath(
+                f"tmp-{tmpTag}{fileDTime()}-{idx.split('/')[0]}{prof['ext']}"
+            )
+            tmpFiles.append(tmpFile)
+            renditions.append(
+                {
+                    "prof": prof,
+                    "outFile": outFile,
+                    "tmpFile": tmpFile,
+                    "cv": prof["cv"],
+                    "ca": prof["ca"],
+                    "ov": [],
+                }
+            )
 
-        compareDur(getFormatDataIn("duration"), getFormatDataOut("duration"), "format")
+        job = {"idx": idx, "file": file, "targets": targets, "renditions": renditions}
+        job["log"] = []
+
+        return fileStage(probeFile, job)
+
+    def verifyStage(job):
+
+        job = fileStage(verifyFile, job)
+
+        if scratchDirs:
+            releaseScratch(getKey(job["file"]))
+
+        if pargs.share:
+            releaseLease(getKey(job["file"]))
+
+        if pargs.metrics:
+            record = fileRecord(job["file"], job["targets"][0][1], job["res"])
+            writeRecord(pargs.metrics, record)
+
+        res = job["res"]
+        if perfDb is not None and not (isinstance(res, Exception) or "skipped" in res):
+            addJob(perfDb, perfRow(job))
+
+        return job
+
+    def fileRecord(file, outFile, res):
+        record = {"time": now(), "host": node(), "file": str(file)}
+        if isinstance(res, Exception):
+            return {
+                **record,
+                "status": "error",
+                "exitCode": getattr(res, "returncode", None),
+                "error": str(res),
+            }
+        if res.get("skipped"):
+            return {**record, "status": "skipped"}
+        return {
+            **record,
+            "status": "ok",
+            "exitCode": 0,
+            "outFile": str(outFile),
+            "probeTime": round(res["probeTime"], 3),
+            "encodeTime": round(res["timeTaken"], 3),
+            "publishTime": round(res["publishTime"], 3),
+            "verifyTime": round(res["verifyTime"], 3),
+            "inBytes": res["inSize"],
+            "outBytes": res["outSize"],
+            "duration": res["length"],
+            "speed": round(res["length"] / res["timeTaken"], 3),
+            "args": res["args"],
+            **({"renditions": res["renditions"]} if "renditions" in res else {}),
+        }
+
+    rendArgs = lambda rend: [*rend["cv"], *rend["ov"], *rend["ca"]]
+
+    def perfRow(job):
+        # history row of a finished job, output dims are the first rendition's
+        res, rend = job["res"], job["renditions"][0]
+        prof = rend["prof"]
+        hasVideo = not noVideo and rend["cv"] != ["-vn"]
+        vdoParams = getMeta(job["metaDataIn"], meta, "video") if hasVideo else {}
+        return {
+            "host": node(),
+            "key": settingsKey([r["prof"] for r in job["renditions"]]),
+            "codec": "vc" if copied(rend["cv"]) else prof["cVideo"],
+            "preset": presetOf(rend["cv"]),
+            "audio": "ac" if copied(rend["ca"]) else prof["cAudio"],
+            "args": jDumps([rendArgs(r) for r in job["renditions"]]),
+            "height": (
+                min(int(toFloat(vdoParams.get("height"))), prof["res"])
+                if vdoParams
+                else None
+            ),
+            "fps": (
+                min(toFps(vdoParams.get("r_frame_rate")), prof["fps"])
+                if vdoParams
+                else None
+            ),
+            "renditions": len(job["renditions"]),
+            "jobs": jobs,
+            "duration": res["length"],
+            "wall": res["timeTaken"],
+            "inBytes": res["inSize"],
+            "outBytes": res["outSize"],
+        }
+
+    def probeFile(job):
+
+        file = job["file"]
+
+        strtTime = time()
+        metaDataIn = probed.pop(file, None) or getMetaDataP(file)
+        job["probeTime"] = time() - strtTime
+        if isinstance(metaDataIn, Exception):
+            return metaDataIn
+
+        job["metaDataIn"] = metaDataIn
+        etaUpdate(eta, file, media=getDuration(metaDataIn))
+
+    def encodeFile(job):
+
+        idx, file, renditions = job["idx"], job["file"], job["renditions"]
+        metaDataIn = job["metaDataIn"]
+
+        statusInfoP = partial(statusInfo, idx=idx, file=file)
+
+        statusInfoP("Processing")
+
+        getMetaP = partial(getMeta, metaDataIn, meta)
+
+        adoInParams = getMetaP("audio")
+
+        duration = getDuration(metaDataIn)
+        vdoInParams = None if noVideo else getMetaP("video")
+
+        if pargs.decide:
+            rend = renditions[0]  # -dc is only allowed with a single profile
+            decided = decideFile(metaDataIn, vdoInParams, adoInParams)
+            if decided is None:
+                printNLog("\nSkipping: all streams are already efficient.")
+                statusInfoP("Skipped")
+                addEntry(
+                    rend["prof"]["manifestFile"],
+                    rend["prof"]["manifest"],
+                    makeEntry(getKey(file), file, settings, result="skipped"),
+                )
+                return {"skipped": True}
+            rend["cv"], rend["ca"] = decided
+
+        vdoRends = [
+            r for r in renditions if not (r["cv"] == ["-vn"] or copied(r["cv"]))
+        ]
+        chunked = len(renditions) == 1 and vdoRends and useChunks(duration)
+        threads = encoderThreads(pargs.chunkJobs if chunked else len(vdoRends))
+
+        for rend in vdoRends:
+            prof = rend["prof"]
+            crf = prof["qVideo"]
+
+            vdoOpts = partial(
+                optsVideo,
+                vdoInParams["height"],
+                vdoInParams["r_frame_rate"],
+                prof["res"],
+                prof["fps"],
+            )
 
-    else:
+            if targetMode and not duration:
+                printNLog("\nNo duration to size a target for, keeping the crf.")
+            elif targetMode:
+                rate = targetRate(
+                    duration,
+                    pargs.targetSize,
+                    pargs.targetBpp,
+                    (getBitrate(rend["ca"]) or 0) if adoInParams else 0,
+                    outDims(
+                        vdoInParams["width"],
+                        vdoInParams["height"],
+                        vdoInParams["r_frame_rate"],
+                        prof["res"],
+                        prof["fps"],
+                    ),
+                )
+                found = searchCrf(
+                    ffmpegPath,
+                    file,
+                    rend["tmpFile"],
+                    prof["cVideo"],
+                    prof["speed"],
+                    vdoOpts(),
+                    duration,
+                    rate,
+                    metaCache,
+                    # trials run one at a time, each with the job's whole budget
+                    encoderThreads(1),
+                )
+                if isinstance(found, Exception):
+                    return found
+                if found is not None:
+                    crf = found
+
+            rend["cv"] = selectCodec(prof["cVideo"], crf, prof["speed"], threads)
+            rend["ov"] = vdoOpts(threads)
+
+        rend = renditions[0]
+
+        strtTime = time()
+        if chunked:
+            cmdOut = encodeChunked(
+                ffmpegPath,
+                file,
+                rend["tmpFile"],
+                rend["ca"],
+                rend["cv"],
+                rend["ov"],
+                pargs.chunkSize,
+                pargs.chunkJobs,
+                bool(adoInParams),
+            )
+        else:
+            if len(renditions) == 1:
+                cmd = getffmpegCmd(
+                    ffmpegPath,
+                    file,
+                    rend["tmpFile"],
+                    rend["ca"],
+                    rend["cv"],
+                    rend["ov"],
+                )
+            else:
+                cmd = getffmpegMultiCmd(
+                    ffmpegPath,
+                    file,
+                    [(r["tmpFile"], r["ca"], r["cv"], r["ov"]) for r in renditions],
+                )
+            printNLog(f"\n{shJoin(cmd)}")
+            if pargs.progress > 0:
+                onProgress = partial(progressInfo, idx, file)
+            else:
+                onProgress = None
+            cmdOut = runffmpeg(cmd, duration, onProgress, pargs.progress)
+        if isinstance(cmdOut, Exception):
+            return cmdOut
+        job["timeTaken"] = time() - strtTime
+        lastTime[:] = [job["timeTaken"]]
+
+        if cmdOut:
+            printNLog(f"\n{cmdOut}")
+
+        statusInfoP("Processed")
+
+    def verifyFile(job):
+
+        file, renditions = job["file"], job["renditions"]
+        metaDataIn = job["metaDataIn"]
+
+        # on the verify pool, a copy from scratch to a NAS doesn't hold up encoding
+        strtTime = time()
+        for rend in renditions:
+            outFile = rend["outFile"]
+            if pargs.recursive and not outFile.parent.exists():
+                outFile.parent.mkdir(parents=True, exist_ok=True)
+            publishFile(rend["tmpFile"], outFile)
+            rend["prof"]["outFiles"].add(outFile)
+        publishTime = time() - strtTime
+
+        strtTime = time()
+
+        for rend in renditions:
+            if len(renditions) > 1:
+                printNLog(f"\nRendition: {rend['prof']['outDir'].name}")
+            metaDataOut = verifyOutput(metaDataIn, rend)
+            if isinstance(metaDataOut, Exception):
+                return metaDataOut
+
+        # video only inputs have no audio stream to take the duration from
+        strmParams = getMeta(metaDataIn, meta, "audio") or getMeta(
+            metaDataIn, meta, "video"
+        )
+        length = float(
+            strmParams["duration"]
+            if not pargs.format
+            else getFormatData(metaDataIn, "duration")
+        )
+
+        res = {
+            "length": length,
+            "timeTaken": job["timeTaken"],
+            "inSize": file.stat().st_size,
+            "outSize": sum(r["outFile"].stat().st_size for r in renditions),
+        }
+        extra = {
+            "probeTime": job["probeTime"],
+            "publishTime": publishTime,
+            "verifyTime": time() - strtTime,
+            "args": rendArgs(renditions[0]),
+        }
+        if len(renditions) > 1:
+            extra["renditions"] = [
+                {
+                    "outFile": str(r["outFile"]),
+                    "outBytes": r["outFile"].stat().st_size,
+                    "args": rendArgs(r),
+                }
+                for r in renditions
+            ]
+
+        for r in renditions:
+            prof = r["prof"]
+            addEntry(
+                prof["manifestFile"],
+                prof["manifest"],
+                makeEntry(
+                    getKey(file),
+                    file,
+                    prof["settings"],
+                    args=rendArgs(r),
+                    result="done",
+                    outFile=r["outFile"].relative_to(prof["outDir"]).as_posix(),
+                    **{**res, "outSize": r["outFile"].stat().st_size},
+                ),
+            )
+
+        return {**res, **extra}
+
+    def verifyOutput(metaDataIn, rend):
+        # probe an output and warn about stream durations that differ from the input
+
+        metaDataOut = getMetaDataP(rend["outFile"])
+        if isinstance(metaDataOut, Exception):
+            return metaDataOut
+
+        getMetaInP = partial(getMeta, metaDataIn, meta)
+        getMetaOutP = partial(getMeta, metaDataOut, meta)
+
+        hasVideo = rend["cv"] != ["-vn"]
+
+        if hasVideo:
+
+            vdoInParams, vdoOutParams = getMetaInP("video"), getMetaOutP("video")
+
+            printNLog(
+                f"\nVideo Input:: {formatParams(vdoInParams)}"
+                f"\nVideo Output:: {formatParams(vdoOutParams)}"
+            )
 
-        compareDur(
-            vdoInParams["duration"],
-            vdoOutParams["duration"],
-            vdoInParams["codec_type"],
+        adoInParams, adoOutParams = getMetaInP("audio"), getMetaOutP("audio")
+
+        if adoInParams:
+            printNLog(
+                f"\nAudio Input:: {formatParams(adoInParams)}"
+                f"\nAudio Output:: {formatParams(adoOutParams)}"
+            )
+
+        getFormatDataIn = partial(getFormatData, metaDataIn)
+        getFormatDataOut = partial(getFormatData, metaDataOut)
+
+        if pargs.format:
+
+            compareDur(
+                getFormatDataIn("duration"), getFormatDataOut("duration"), "format"
+            )
+
+        else:
+
+            if hasVideo:
+                compareDur(
+                    vdoInParams["duration"],
+                    vdoOutParams["duration"],
+                    vdoInParams["codec_type"],
+                )
+
+            if adoInParams:
+                compareDur(
+                    adoInParams["duration"],
+                    adoOutParams["duration"],
+                    adoInParams["codec_type"],
+                )
+
+        return metaDataOut
+
+    skipped = []
+
+    def skipFile(file):
+        skipped.append(file)
+        etaDrop(eta, file)
+
+    def etaKey(targets):
+        # a rendition set new to this run starts from earlier runs on this host
+        key = targetsKey(targets)
+        if perfDb is not None and key not in eta["speed"]:
+            known = learned(perfDb, node(), settingsKey([p for p, _ in targets]))
+            if known:
+                etaSeed(eta, key, known["media"], known["wall"], known["inBytes"])
+        return key
+
+    def pendingFiles():
+        idx = 0
+        for file in files:
+
+            if file is Idle:
+                yield Idle
+                continue
+
+            idx += 1
+
+            fileIdx = f"{idx}/{nFiles()}"
+
+            targets = [
+                (p, getOutFile(file, p)) for p in profiles if not isComplete(file, p)
+            ]
+
+            if not targets:
+                statusInfo("Skipping", fileIdx, file)
+                skipFile(file)
+                continue
+
+            if pargs.share:
+                if not claimLease(leaseDir, getKey(file), owner, pargs.leaseTime):
+                    statusInfo("Skipping (leased by another host)", fileIdx, file)
+                    skipFile(file)
+                    continue
+                targets = [t for t in targets if not publishedElsewhere(*t)]
+                if not targets:
+                    releaseLease(getKey(file))
+                    statusInfo("Skipping (done by another host)", fileIdx, file)
+                    skipFile(file)
+                    continue
+
+            etaUpdate(eta, file, key=etaKey(targets))
+            yield fileIdx, file, targets
+
+    lastTime = []
+
+    def coolDown():
+        if not lastTime:
+            return
+        timeTaken = lastTime.pop()
+        if pargs.wait:
+            waitN(int(pargs.wait))
+        else:
+            waitN(int(dynWait(timeTaken)))
+
+    batchTotals = {"files": {}, "batch_start_timestamp_seconds": round(time())}
+
+    def updateTotals(status, res=None):
+        files = batchTotals["files"]
+        files[status] = files.get(status, 0) + 1
+        if res:
+            for key, name in [
+                ("inSize", "input_bytes"),
+                ("outSize", "output_bytes"),
+                ("length", "media_seconds"),
+                ("timeTaken", "encode_seconds"),
+            ]:
+                batchTotals[name] = batchTotals.get(name, 0) + res[key]
+        batchTotals["last_update_timestamp_seconds"] = round(time())
+        if pargs.promFile:
+            writeProm(
+                pargs.promFile, batchTotals, {"host": node(), "dir": str(dirPath)}
+            )
+
+    failed = []
+
+    def fileDone(res):
+
+        if isinstance(res, Exception):
+            reportErr(res)
+            updateTotals("error")
+            failed.append(res)
+            # a batch stops at the first error, a daemon keeps watching
+            return not pargs.watch
+
+        if res.get("skipped"):
+            skipped.append(res)
+            updateTotals("skipped")
+            return
+
+        updateTotals("ok", res)
+
+        length, timeTaken = res["length"], res["timeTaken"]
+        inSize, outSize = res["inSize"], res["outSize"]
+
+        for key, stats in totals.items():
+            addStat(stats, res[key])
+
+        inSum, inMean = totals["inSize"]["sum"], meanStat(totals["inSize"])
+        outSum, outMean = totals["outSize"]["sum"], meanStat(totals["outSize"])
+        timeSum, lengthSum = totals["timeTaken"]["sum"], totals["length"]["sum"]
+        filesLeft = (
+            len(fileList) - totals["timeTaken"]["n"] - len(skipped) - len(failed)
         )
+        timeLeft, mediaLeft = etaLeft(eta, max(1, min(jobs, filesLeft)))
 
-        compareDur(
-            adoInParams["duration"],
-            adoOutParams["duration"],
-            adoInParams["codec_type"],
+        printNLog(
+            "\n"
+            f"\nProcessed: {secsToHMS(length)}/{bytesToMB(inSize)} MB"
+            f" in: {secsToHMS(timeTaken)}/{bytesToMB(outSize)} MB"
+            f" at speed: x{round2(length/timeTaken)}."
+            "\n"
+            f"\nTotal size reduced by: {(bytesToMB(inSum-outSum))} MB "
+            f"to {(bytesToMB(outSum))} MB at an average of:"
+            f" {round2(((inMean-outMean)/inMean)*100)}% size reduction."
+            f"\nProcessed: {secsToHMS(timeSum)}/{(bytesToMB(inSum))} MB"
+            f" at average speed: x{round2(lengthSum/timeSum)}"
+            f" for average input size: {(bytesToMB(inMean))} MB."
+            f"\nEstimated output size: {bytesToMB(outMean * len(fileList))} MB"
+            f" for: {nFiles()} file(s) at average output"
+            f" size: {(bytesToMB(outMean))} MB."
+            "\nEstimated time left: "
+            f"{'N/A' if timeLeft is None else secsToHMS(timeLeft)}"
+            f" for: {filesLeft}{'' if scanDone else '+'} file(s)"
+            f"/{secsToHMS(mediaLeft)} at the speed measured for their outputs"
+            f" with {jobs} job(s)."
         )
 
-    length = float(
-        adoInParams["duration"] if not pargs.format else getFormatDataIn("duration")
-    )
-    inSize = file.stat().st_size
-    outSize = outFile.stat().st_size
-    inSizes.append(inSize)
-    outSizes.append(outSize)
-    lengths.append(length)
-    inSum, inMean, = sum(inSizes), fmean(inSizes)  # fmt: skip
-    outSum, outMean = sum(outSizes), fmean(outSizes)
-    filesLeft = len(fileList) - (idx + 1)
-
-    printNLog(
-        "\n"
-        f"\nProcessed: {secsToHMS(length)}/{bytesToMB(inSize)} MB"
-        f" in: {secsToHMS(timeTaken)}/{bytesToMB(outSize)} MB"
-        f" at speed: x{round2(length/timeTaken)}."
-        "\n"
-        f"\nTotal size reduced by: {(bytesToMB(inSum-outSum))} MB "
-        f"to {(bytesToMB(outSum))} MB at an average of:"
-        f" {round2(((inMean-outMean)/inMean)*100)}% size reduction."
-        f"\nProcessed: {secsToHMS(sum(totalTime))}/{(bytesToMB(inSum))} MB"
-        f" at average speed: x{round2(fmean(lengths)/fmean(totalTime))}"
-        f" for average input size: {(bytesToMB(inMean))} MB."
-        f"\nEstimated output size: {bytesToMB(outMean * len(fileList))} MB"
-        f" for: {len(fileList)} file(s) at average output"
-        f" size: {(bytesToMB(outMean))} MB."
-        "\nEstimated time left: "
-        f"{secsToHMS(fmean(totalTime) * filesLeft)} for: {filesLeft} file(s)"
-        f" at average processing time: {secsToHMS(fmean(totalTime))}."
-    )
-
-    if idx + 1 == len(fileList):
-        continue
-
-    if pargs.wait:
-        waitN(int(pargs.wait))
+    def recordError(job):
+        file = job["file"]
+        try:
+            for prof, _ in job["targets"]:
+                addEntry(
+                    prof["manifestFile"],
+                    prof["manifest"],
+                    makeEntry(getKey(file), file, prof["settings"], result="error"),
+                )
+        except OSError as err:
+            reportErr(err)
+
+    def jobDone(job):
+        # in file order, so each file's log is written in one piece after the last
+        if isinstance(job, Exception):
+            # not tied to a file, so stop even when watching
+            fileDone(job)
+            return True
+        res = job["res"]
+        if isinstance(res, Exception):
+            recordError(job)
+        if isinstance(res, Exception) or res.get("skipped"):
+            etaDrop(eta, job["file"])
+        else:
+            etaDone(eta, job["file"], res["length"], res["timeTaken"], res["inSize"])
+        writeLog(*job["log"])
+        return fileDone(res)
+
+    stages = [probeStage, partial(fileStage, encodeFile), verifyStage]
+
+    # what jobDone would stop on, known as soon as the encode stage fails
+    stopOn = lambda job: isinstance(job, Exception) or (
+        not pargs.watch and isinstance(job.get("res"), Exception)
+    )
+
+    if pargs.throttle:
+        from modules.throttle import makeThrottle
+
+        canStart = makeThrottle(
+            lambda reason: printNLog(
+                f"\nHolding back new jobs, host is busy: {reason}."
+            ),
+            # a job's encoders use all cores unless -th budgets them
+            jobThreads=lambda: min(cores, encoderThreads(1) or cores),
+            maxLoad=pargs.maxLoad,
+            maxPressure=pargs.maxPressure,
+            maxTemp=pargs.maxTemp,
+        )
+        runPipeline(
+            stages,
+            pendingFiles(),
+            jobs,
+            jobDone,
+            canStart=canStart,
+            depth=jobs,
+            stopOn=stopOn,
+        )
     else:
-        waitN(int(dynWait(timeTaken)))
+        runPipeline(
+            stages, pendingFiles(), jobs, jobDone, coolDown, depth=jobs, stopOn=stopOn
+        )
+
+    if failed:
+        exit(1)
 
 
-def exe():
-    pass
+if __name__ == "__main__":
+    main()
 
 
 # H264(x264): medium efficiency, fast encoding, widespread support